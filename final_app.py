@@ -1,5 +1,7 @@
 import streamlit as st
 from improved_rag_system import graph
+from resources import get_answer_cache, get_retriever, readiness, wait_until_ready, warm_up
+from tracing import new_trace_id, tracer
 
 # ---------------- PAGE CONFIG ----------------
 st.set_page_config(
@@ -10,6 +12,16 @@ st.set_page_config(
 
 st.title("🧪 Chemical Engineering Multi-Agent RAG System")
 
+# Load the retriever, stores and models in the background (once per process)
+# so the page renders immediately; questions wait for it below.
+warm_up(background=True)
+
+warm_state = readiness()
+if warm_state["status"] == "warming":
+    st.caption(f"⏳ Loading retriever and models ({warm_state['step']})...")
+elif warm_state["status"] == "failed":
+    st.error(f"Startup failed: {warm_state['error']}")
+
 # ---------------- SESSION STATE ----------------
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -49,23 +61,54 @@ with chat_tab:
 
                 logs = []
 
-                final_state = None
-
-                for event in graph.stream(
-                    {
-                        "user_query": user_input,
-                        "retries": 0,
-                        "rewrite_tries": 0
-                    },
-                    stream_mode="values"
-                ):
-                    logs.append(event)
-                    final_state = event
+                wait_until_ready()
+                answer_cache = get_answer_cache()
+                final_state = answer_cache.lookup(user_input)
+
+                if final_state is None:
+                    trace_id = new_trace_id()
+
+                    # Draft tokens render as they arrive; a draft that verification
+                    # sends back for revision is replaced by the next one.
+                    status_line = st.empty()
+                    draft_area = st.empty()
+                    draft_text = ""
+
+                    for mode, event in graph.stream(
+                        {
+                            "user_query": user_input,
+                            "retries": 0,
+                            "rewrite_tries": 0
+                        },
+                        config={"configurable": {"trace_id": trace_id}},
+                        stream_mode=["custom", "values"]
+                    ):
+                        if mode == "values":
+                            final_state = event
+                        elif event.get("event") == "token":
+                            draft_text += event["text"]
+                            draft_area.markdown(draft_text + "▌")
+                        elif event.get("event") == "superseded":
+                            status_line.caption(f"✏️ Draft {event['draft_id']} superseded ({event['by']})...")
+                            draft_text = ""
+
+                    status_line.empty()
+                    draft_area.empty()
+
+                    logs = tracer.spans_for(trace_id)
+                    answer_cache.store(user_input, final_state)
 
                 answer = final_state.get("answer", "No answer generated.")
 
                 st.markdown(answer)
 
+                if final_state.get("cache_hit"):
+                    st.caption(f"⚡ Served from answer cache ({final_state['cache_hit']} match)")
+                    if final_state.get("evidence"):
+                        with st.expander("Evidence"):
+                            for quote in final_state["evidence"]:
+                                st.markdown(f"> {quote}")
+
         # Save assistant message
         st.session_state.messages.append({
             "role": "assistant",
@@ -85,11 +128,51 @@ with log_tab:
     st.subheader("Execution Trace")
 
     if not st.session_state.logs:
-        st.info("No logs yet. Ask a question first.")
+        st.info("No logs yet. Ask a question first (cached answers do not run the pipeline).")
     else:
-        for i, log in enumerate(st.session_state.logs):
-            with st.expander(f"Step {i+1}"):
-                st.json(log)
+        spans = st.session_state.logs
+        t0 = spans[0]["start"]
+        total_ms = max(
+            (span["start"] - t0) * 1000 + span["duration_ms"] for span in spans
+        )
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Total", f"{total_ms:.0f} ms")
+        col2.metric("LLM calls", sum(span["llm_calls"] for span in spans))
+        col3.metric(
+            "Tokens (prompt / completion)",
+            f"{sum(span['prompt_tokens'] for span in spans)} / "
+            f"{sum(span['completion_tokens'] for span in spans)}"
+        )
+
+        # Per-node timeline: bar length is the node's share of total wall time
+        for span in spans:
+            offset_ms = (span["start"] - t0) * 1000
+            details = f"{span['llm_calls']} LLM calls"
+            if span["docs_out"] is not None:
+                details += f", {span['docs_out']} docs"
+            if span["relevant_docs"] is not None:
+                details += f", {span['relevant_docs']} relevant"
+            if span["rewrite_tries"] or span["retries"]:
+                details += f", rewrite {span['rewrite_tries']} / retry {span['retries']}"
+
+            st.progress(
+                min(span["duration_ms"] / total_ms, 1.0) if total_ms else 0.0,
+                text=f"+{offset_ms:.0f} ms  **{span['node']}**  {span['duration_ms']:.0f} ms ({details})"
+            )
+
+        with st.expander("Per-node latency (all requests in this process)"):
+            st.dataframe(
+                [{"node": node, **stats} for node, stats in tracer.summary().items()]
+            )
+            embeddings = get_retriever().embeddings if readiness()["status"] == "ready" else None
+            if hasattr(embeddings, "stats"):
+                embedding_stats = embeddings.stats()
+                st.caption(
+                    f"Embedding cache: {embedding_stats['hit_ratio']:.1%} hits "
+                    f"({embedding_stats['memory_hits']} memory, {embedding_stats['disk_hits']} disk, "
+                    f"{embedding_stats['misses']} embedded)"
+                )
 
 
 # ---------------- FOOTER ----------------
@@ -1,12 +1,11 @@
 from pydantic import BaseModel,Field
 import json
-from langchain_ollama import OllamaLLM
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
-from query_analyzer_agent import load_llm
+from chain_registry import get_chain
 
-def direct_generation_func(user_query):
+def build_direct_generation_chain(llm):
     direct_generation_prompt=PromptTemplate.from_template(
         """
         Answer the given question using your general knowledge.
@@ -18,8 +17,14 @@ def direct_generation_func(user_query):
         {user_query}
         """
     )
-    llm=load_llm()
-    chain= direct_generation_prompt | llm | StrOutputParser()
+    return direct_generation_prompt | llm | StrOutputParser()
+
+def direct_generation_func(user_query):
+    chain= get_chain("direct_generation", build_direct_generation_chain)
     result = chain.invoke({'user_query': user_query})
     return result.strip()
 
+async def adirect_generation_func(user_query):
+    chain= get_chain("direct_generation", build_direct_generation_chain)
+    result = await chain.ainvoke({'user_query': user_query})
+    return result.strip()
@@ -0,0 +1,175 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from hybrid_retrieval_agent import VECTOR_DB_DIR
+
+
+# ==========================================================
+# ---------------------- CONFIG ----------------------------
+# ==========================================================
+
+MANIFEST_PATH = os.path.join(VECTOR_DB_DIR, "manifest.json")
+
+SIMILARITY_THRESHOLD = 0.92
+TTL_SECONDS = 6 * 3600
+MAX_ENTRIES = 512
+
+CITATION_PATTERN = re.compile(r"\(Source:\s*[^,()]+,\s*Page:\s*[^)]+\)")
+
+
+def normalize_query(query):
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?!. ")
+
+
+def doc_sources(docs):
+    """
+    [{"source_file", "page_number"}] for the docs an answer was built from.
+    """
+    return [
+        {"source_file": doc.metadata.get("source_file"), "page_number": doc.metadata.get("page_number")}
+        for doc in docs or []
+    ]
+
+
+def manifest_fingerprint(path=MANIFEST_PATH):
+    """
+    Changes whenever ingest.py rewrites the manifest.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+# ==========================================================
+# ---------------- SEMANTIC ANSWER CACHE -------------------
+# ==========================================================
+
+class AnswerCache:
+    """
+    Final answers keyed by normalized query, with an embedding-similarity
+    fallback for near-duplicate questions. Only answers that passed both
+    IsSUP (fully_supported) and IsUSE (useful) are stored.
+    """
+
+    def __init__(
+        self,
+        embeddings=None,
+        similarity_threshold=SIMILARITY_THRESHOLD,
+        ttl_seconds=TTL_SECONDS,
+        max_entries=MAX_ENTRIES,
+        manifest_path=MANIFEST_PATH,
+    ):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.manifest_path = manifest_path
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint = manifest_fingerprint(manifest_path)
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0}
+
+    # ---------------- lookup ----------------
+
+    def lookup(self, query):
+        key = normalize_query(query)
+
+        with self._lock:
+            self._expire()
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return dict(entry["result"], cache_hit="exact")
+
+            if self.embeddings is None or not self._entries:
+                self.stats["misses"] += 1
+                return None
+
+            keys = list(self._entries)
+            matrix = np.stack([self._entries[k]["embedding"] for k in keys])
+
+        vector = self._embed(key)
+        similarities = matrix @ vector
+        best = int(np.argmax(similarities))
+
+        with self._lock:
+            entry = self._entries.get(keys[best])
+            if entry is None or similarities[best] < self.similarity_threshold:
+                self.stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(keys[best])
+            self.stats["semantic_hits"] += 1
+            return dict(entry["result"], cache_hit="semantic", similarity=float(similarities[best]))
+
+    # ---------------- store ----------------
+
+    def store(self, query, state):
+        """
+        Caches a final graph state if it was fully supported and useful.
+        Returns True when the answer was stored.
+        """
+        if state.get("issup") != "fully_supported" or state.get("isuse") != "useful":
+            return False
+
+        answer = state.get("answer") or ""
+        key = normalize_query(query)
+
+        result = {
+            "user_query": query,
+            "answer": answer,
+            "evidence": list(state.get("evidence") or []),
+            "citations": CITATION_PATTERN.findall(answer),
+            "sources": doc_sources(state.get("relevant_docs")),
+            "issup": state["issup"],
+            "isuse": state["isuse"],
+            "use_reason": state.get("use_reason"),
+        }
+        embedding = self._embed(key) if self.embeddings is not None else None
+
+        with self._lock:
+            self._expire()
+            self._entries[key] = {"result": result, "embedding": embedding, "created_at": time.time()}
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+            self.stats["stores"] += 1
+
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # ---------------- internals ----------------
+
+    def _embed(self, text):
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _expire(self):
+        """
+        Drops everything when the ingest manifest changed, then TTL-expired entries.
+        Caller holds the lock.
+        """
+        fingerprint = manifest_fingerprint(self.manifest_path)
+        if fingerprint != self._fingerprint:
+            self._entries.clear()
+            self._fingerprint = fingerprint
+
+        cutoff = time.time() - self.ttl_seconds
+        for key in [k for k, entry in self._entries.items() if entry["created_at"] < cutoff]:
+            del self._entries[key]
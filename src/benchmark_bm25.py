@@ -0,0 +1,88 @@
+import argparse
+import tempfile
+import time
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from bm25_index import BM25Index, build_bm25_store, load_chunks
+from hybrid_retrieval_agent import BM25_STORE_DIR, TOP_K_BM25
+from synthetic_corpus import generate_corpus, generate_queries
+
+
+# ==========================================================
+# ---------------- BENCHMARK -------------------------------
+# ==========================================================
+
+def rank_bm25_top_k(bm25, analyzer, query, k):
+    """
+    The pre-inverted-index path: full-corpus scoring + Python sort.
+    """
+    scores = bm25.get_scores(analyzer(query))
+    return sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
+
+
+def time_queries(fn, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        latencies.append(time.perf_counter() - start)
+    return np.asarray(latencies) * 1000
+
+
+def report(name, latencies_ms):
+    print(
+        f"{name:<16} mean={latencies_ms.mean():8.3f}ms  "
+        f"p50={np.percentile(latencies_ms, 50):8.3f}ms  "
+        f"p95={np.percentile(latencies_ms, 95):8.3f}ms  "
+        f"qps={1000 / latencies_ms.mean():9.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inverted-index BM25 vs rank_bm25 benchmark")
+    parser.add_argument("--store-dir", default=None, help=f"BM25 store to benchmark (default: synthetic corpus, real store at {BM25_STORE_DIR})")
+    parser.add_argument("--synthetic-docs", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=TOP_K_BM25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.store_dir:
+            store_dir = args.store_dir
+            chunks = load_chunks(store_dir)
+        else:
+            print(f"Generating {args.synthetic_docs} synthetic chunks...")
+            chunks = generate_corpus(args.synthetic_docs)
+            store_dir = tmp_dir
+            build_bm25_store(chunks, store_dir)
+
+        queries = [q["query"] for q in generate_queries(chunks, args.queries)]
+
+        start = time.perf_counter()
+        index = BM25Index.load(store_dir)
+        analyzer = index.analyzer
+        print(f"BM25Index load:  {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        start = time.perf_counter()
+        bm25 = BM25Okapi([analyzer(chunk.page_content) for chunk in chunks])
+        print(f"BM25Okapi build: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        # Parity: identical ranking for every query (zero-score padding excluded).
+        mismatches = 0
+        for query in queries:
+            expected = rank_bm25_top_k(bm25, analyzer, query, args.k)
+            scores = bm25.get_scores(analyzer(query))
+            expected = [i for i in expected if scores[i] > 0]
+            got, _ = index.top_k(analyzer(query), args.k)
+            if list(got) != expected:
+                mismatches += 1
+        print(f"Ranking mismatches: {mismatches}/{len(queries)}")
+
+        report("rank_bm25", time_queries(lambda q: rank_bm25_top_k(bm25, analyzer, q, args.k), queries))
+        report("inverted-index", time_queries(lambda q: index.top_k(analyzer(q), args.k), queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from bm25_index import build_bm25_store
+from dense_index import (
+    ANN_INDEX_FILE, ANN_META_FILE, FLAT_INDEX_FILE, INDEX_TYPES,
+    build_ann_index, index_size_mb, write_ann_index, write_row_map
+)
+from hybrid_retrieval_agent import VECTOR_DB_DIR, HybridRetrievalAgent
+from synthetic_corpus import HashingEmbeddings, generate_corpus, generate_queries, read_queries, write_queries
+
+
+# ==========================================================
+# ---------------------- CONFIG ----------------------------
+# ==========================================================
+
+MODES = ["dense", "bm25", "hybrid"]
+RERANK_MODE = "rerank"      # hybrid over-fetch + cross-encoder; opt-in (downloads the model)
+RERANK_CANDIDATES = 50
+ROUTED_MODE = "routed"      # hybrid restricted to the topic classifier's topics (whole corpus if unsure)
+
+NPROBE_SWEEP = [1, 4, 16, 64]
+EF_SEARCH_SWEEP = [16, 64, 256]
+
+
+# ==========================================================
+# ---------------- STORES ----------------------------------
+# ==========================================================
+
+def load_benchmark_embeddings(name):
+    if name == "hashing":
+        return HashingEmbeddings()
+
+    from hybrid_retrieval_agent import load_embeddings
+    return load_embeddings()
+
+
+def build_synthetic_stores(out_dir, num_docs, embeddings):
+    """
+    Writes a FAISS store + BM25 store for a synthetic corpus, laid out like ingest.py's.
+    Returns the chunks.
+    """
+    chunks = generate_corpus(num_docs)
+
+    vectorstore = FAISS.from_documents(
+        chunks,
+        embeddings,
+        ids=[chunk.metadata["chunk_id"] for chunk in chunks]
+    )
+    vectorstore.save_local(out_dir)
+    chunk_ids = build_bm25_store(chunks, os.path.join(out_dir, "bm25"))
+    write_row_map(vectorstore, chunk_ids, out_dir)
+
+    return chunks
+
+
+# ==========================================================
+# ---------------- METRICS ---------------------------------
+# ==========================================================
+
+def peak_rss_mb():
+    """
+    Peak RSS of this process so far. Each measurement runs in its own
+    spawned process (run_isolated), so this is the peak of one mode / index.
+    """
+    try:
+        import resource
+    except ImportError:
+        return float("nan")
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def first_hit_rank(docs, expected):
+    wanted = {(e["source_file"], e["page_number"]) for e in expected}
+    for rank, doc in enumerate(docs, start=1):
+        if (doc.metadata.get("source_file"), doc.metadata.get("page_number")) in wanted:
+            return rank
+    return None
+
+
+def make_search(agent, mode, k):
+    if mode == ROUTED_MODE:
+        def routed(query):
+            filters = agent.route(query)
+            return (agent.retrieve(query, filters=filters) if filters else []) or agent.retrieve(query)
+        return routed
+
+    if mode != RERANK_MODE:
+        return lambda query: agent.retrieve(query, mode=mode)
+
+    from reranker_agent import get_reranker
+    reranker = get_reranker()
+    return lambda query: reranker.rerank(
+        query, agent.retrieve(query, candidates=RERANK_CANDIDATES), top_n=k, min_score=None
+    )
+
+
+def run_mode(agent, queries, mode, k, warmup):
+    search = make_search(agent, mode, k)
+
+    for query in queries[:warmup]:
+        search(query["query"])
+
+    latencies = []
+    ranks = []
+
+    start = time.perf_counter()
+    for query in queries:
+        t0 = time.perf_counter()
+        docs = search(query["query"])
+        latencies.append(time.perf_counter() - t0)
+        ranks.append(first_hit_rank(docs[:k], query["expected"]))
+    total = time.perf_counter() - start
+
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "mode": mode,
+        "queries": len(queries),
+        f"recall@{k}": sum(rank is not None for rank in ranks) / len(queries),
+        "mrr": sum(1.0 / rank for rank in ranks if rank) / len(queries),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "qps": len(queries) / total,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_table(results, k):
+    header = f"{'mode':<8} {'recall@' + str(k):>10} {'mrr':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'qps':>9} {'rss MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['mode']:<8} {r[f'recall@{k}']:>10.3f} {r['mrr']:>7.3f} {r['p50_ms']:>9.2f} "
+            f"{r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['qps']:>9.1f} {r['peak_rss_mb']:>9.1f}"
+        )
+
+
+# ==========================================================
+# ---------------- ISOLATED RUNS ---------------------------
+# ==========================================================
+#
+# ru_maxrss only ever grows, so measuring several modes or indexes in one
+# process would report the running maximum. Each measurement instead loads
+# its own agent in a fresh spawned process.
+
+def make_agent(store_dir, embeddings_name, k, index_type="flat"):
+    return HybridRetrievalAgent(
+        vector_db_dir=store_dir,
+        embeddings=load_benchmark_embeddings(embeddings_name),
+        top_n=k,
+        k_dense=k,
+        k_bm25=k,
+        index_type=index_type
+    )
+
+
+def measure(store_dir, embeddings_name, queries, mode, k, warmup, index_type="flat", sweep=({},)):
+    """
+    Runs in the child: one agent, one mode, each set of search params in `sweep`.
+    """
+    agent = make_agent(store_dir, embeddings_name, k, index_type)
+    size_mb = index_size_mb(agent.vectorstore.index)
+
+    results = []
+    for params in sweep:
+        if params:
+            agent.set_search_params(**params)
+        result = run_mode(agent, queries, mode, k, warmup)
+        result["search"] = " ".join(f"{name}={value}" for name, value in params.items()) or "-"
+        result["index_mb"] = size_mb
+        results.append(result)
+    return results
+
+
+def run_isolated(*args, **kwargs):
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(measure, *args, **kwargs).result()
+
+
+def ann_store_view(store_dir, index, meta, view_dir):
+    """
+    A store dir sharing every file of `store_dir` (symlinked, or copied where
+    symlinks are unavailable) but holding its own ann.faiss, so the index is
+    loaded exactly like the retriever loads it and the real store's
+    approximate index is never overwritten.
+    """
+    os.makedirs(view_dir)
+    for name in os.listdir(store_dir):
+        if name in (ANN_INDEX_FILE, ANN_META_FILE):
+            continue
+        src = os.path.abspath(os.path.join(store_dir, name))
+        dst = os.path.join(view_dir, name)
+        try:
+            os.symlink(src, dst, target_is_directory=os.path.isdir(src))
+        except OSError:
+            (shutil.copytree if os.path.isdir(src) else shutil.copy2)(src, dst)
+
+    write_ann_index(index, meta, view_dir)
+    return view_dir
+
+
+def run_index_tradeoff(store_dir, embeddings_name, queries, index_types, k, warmup,
+                       nprobes=NPROBE_SWEEP, ef_searches=EF_SEARCH_SWEEP):
+    """
+    Dense-only recall/latency/size/peak RSS per index type, sweeping nprobe
+    (IVF) and efSearch (HNSW). Each approximate index is built here from the
+    flat one, written to a scratch view of the store and measured in its own
+    process.
+    """
+    import faiss
+
+    results = []
+
+    with tempfile.TemporaryDirectory() as views_dir:
+        for index_type in index_types:
+            if index_type == "flat":
+                view_dir = store_dir
+                sweep = [{}]
+            else:
+                index, meta = build_ann_index(faiss.read_index(os.path.join(store_dir, FLAT_INDEX_FILE)), index_type)
+                view_dir = ann_store_view(store_dir, index, meta, os.path.join(views_dir, index_type))
+                del index
+                sweep = (
+                    [{"nprobe": n} for n in nprobes] if index_type in ("ivf_flat", "ivf_pq")
+                    else [{"ef_search": ef} for ef in ef_searches] if index_type == "hnsw"
+                    else [{}]
+                )
+
+            for result in run_isolated(view_dir, embeddings_name, queries, "dense", k, warmup, index_type, sweep):
+                result["mode"] = index_type
+                results.append(result)
+
+    return results
+
+
+def print_tradeoff_table(results, k):
+    header = (f"{'index':<9} {'search':<13} {'recall@' + str(k):>10} {'mrr':>7} {'p50 ms':>9} {'p99 ms':>9} "
+              f"{'qps':>9} {'index MB':>9} {'rss MB':>9}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['mode']:<9} {r['search']:<13} {r[f'recall@{k}']:>10.3f} {r['mrr']:>7.3f} {r['p50_ms']:>9.2f} "
+            f"{r['p99_ms']:>9.2f} {r['qps']:>9.1f} {r['index_mb']:>9.1f} {r['peak_rss_mb']:>9.1f}"
+        )
+
+
+# ==========================================================
+# ---------------- CLI -------------------------------------
+# ==========================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline recall/latency benchmark for the hybrid retriever")
+    parser.add_argument("--store-dir", default=VECTOR_DB_DIR, help="Vector store dir written by ingest.py")
+    parser.add_argument("--queries", help="JSONL query set with expected source_file/page_number labels")
+    parser.add_argument("--synthetic", type=int, metavar="N_DOCS", help="Benchmark a generated N-doc corpus instead of --store-dir")
+    parser.add_argument("--num-queries", type=int, default=200, help="Queries to generate for --synthetic")
+    parser.add_argument("--save-queries", help="Write the generated query set to this JSONL path")
+    parser.add_argument("--embeddings", choices=["minilm", "hashing"], default="minilm")
+    parser.add_argument("--modes", nargs="+", choices=MODES + [RERANK_MODE, ROUTED_MODE], default=MODES)
+    parser.add_argument("--index-types", nargs="+", choices=INDEX_TYPES,
+                        help="Also compare dense index types (recall vs latency vs size)")
+    parser.add_argument("--k", type=int, default=5, help="Cutoff for recall@k / MRR; also the fused top_n")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.synthetic:
+            print(f"Generating and indexing {args.synthetic} synthetic chunks...")
+            chunks = build_synthetic_stores(tmp_dir, args.synthetic, load_benchmark_embeddings(args.embeddings))
+            store_dir = tmp_dir
+            queries = read_queries(args.queries) if args.queries else generate_queries(chunks, args.num_queries)
+        else:
+            if not args.queries:
+                parser.error("--queries is required unless --synthetic is given")
+            store_dir = args.store_dir
+            queries = read_queries(args.queries)
+
+        if args.save_queries:
+            write_queries(args.save_queries, queries)
+
+        # One fresh process per mode, so each reports its own peak RSS
+        results = [
+            run_isolated(store_dir, args.embeddings, queries, mode, args.k, args.warmup)[0]
+            for mode in args.modes
+        ]
+
+        if args.index_types:
+            tradeoff = run_index_tradeoff(store_dir, args.embeddings, queries, args.index_types, args.k, args.warmup)
+
+    print_table(results, args.k)
+
+    if args.index_types:
+        print()
+        print_tradeoff_table(tradeoff, args.k)
+        results += tradeoff
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
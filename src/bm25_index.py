@@ -0,0 +1,472 @@
+import fnmatch
+import json
+import math
+import mmap
+import os
+import shutil
+from array import array
+from collections import Counter
+
+import numpy as np
+from langchain_core.documents import Document
+
+from text_analyzer import get_analyzer
+
+
+# ==========================================================
+# ---------------------- CONFIG ----------------------------
+# ==========================================================
+
+# Bump whenever the on-disk layout or the scoring inputs change,
+# so stale artifacts are rejected instead of silently misread.
+STORE_VERSION = 4
+
+# Same defaults as rank_bm25.BM25Okapi
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+
+META_FILE = "meta.json"
+VOCAB_FILE = "vocab.json"
+TEXTS_FILE = "texts.bin"
+TEXT_OFFSETS_FILE = "text_offsets.npy"
+TOPICS_FILE = "topics.json"
+TOPIC_CODES_FILE = "topic_codes.npy"
+SOURCES_FILE = "sources.json"
+SOURCE_CODES_FILE = "source_codes.npy"
+PAGES_FILE = "pages.npy"
+CHUNK_IDS_FILE = "chunk_ids.npy"
+TERM_OFFSETS_FILE = "term_offsets.npy"
+POSTING_DOCS_FILE = "posting_docs.npy"
+POSTING_TFS_FILE = "posting_tfs.npy"
+DOC_LENS_FILE = "doc_lens.npy"
+IDF_FILE = "idf.npy"
+
+
+# ==========================================================
+# ---------------- BUILD (INGEST SIDE) ---------------------
+# ==========================================================
+
+def build_bm25_store(chunks, store_dir, analyzer=None):
+    """
+    Writes the BM25 artifact for `chunks` (any iterable, consumed once) into
+    `store_dir`: the columnar chunk store (see ChunkStore), CSR token postings,
+    document lengths and IDF. The store is built in a sibling temp dir and
+    swapped in at the end, so `chunks` may stream from the store being replaced.
+    Text is analyzed with `analyzer` (default: text_analyzer.ANALYZER_CONFIG),
+    whose config is recorded in meta.json for the query side.
+    Returns the chunk IDs in doc-id order.
+    """
+    analyzer = analyzer or get_analyzer()
+
+    tmp_dir = store_dir.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    vocab = {}
+    posting_docs = []
+    posting_tfs = []
+    doc_lens = array("i")
+
+    text_offsets = array("q", [0])
+    topics = {}
+    topic_codes = array("i")
+    sources = {}
+    source_codes = array("i")
+    pages = array("i")
+    chunk_ids = []
+
+    with open(os.path.join(tmp_dir, TEXTS_FILE), "wb") as f:
+        for doc_id, chunk in enumerate(chunks):
+            text = chunk.page_content.encode("utf-8")
+            f.write(text)
+            text_offsets.append(text_offsets[-1] + len(text))
+
+            metadata = chunk.metadata
+            topic_codes.append(_code(topics, metadata.get("topic")))
+            source_codes.append(_code(sources, metadata.get("source_file")))
+            page = metadata.get("page_number")
+            pages.append(-1 if page is None else int(page))
+            chunk_ids.append(metadata.get("chunk_id"))
+
+            tokens = analyzer(chunk.page_content)
+            doc_lens.append(len(tokens))
+
+            for term, tf in Counter(tokens).items():
+                term_id = vocab.setdefault(term, len(vocab))
+                if term_id == len(posting_docs):
+                    posting_docs.append(array("i"))
+                    posting_tfs.append(array("i"))
+                posting_docs[term_id].append(doc_id)
+                posting_tfs[term_id].append(tf)
+
+    num_docs = len(doc_lens)
+    avgdl = sum(doc_lens) / num_docs if num_docs else 0.0
+
+    term_offsets = np.zeros(len(posting_docs) + 1, dtype=np.int64)
+    np.cumsum([len(plist) for plist in posting_docs], out=term_offsets[1:])
+
+    def _flatten(lists):
+        flat = np.empty(int(term_offsets[-1]), dtype=np.int32)
+        for term_id, plist in enumerate(lists):
+            flat[term_offsets[term_id]:term_offsets[term_id + 1]] = np.frombuffer(plist, dtype=np.int32)
+        return flat
+
+    idf = compute_idf(np.diff(term_offsets), num_docs)
+
+    np.save(os.path.join(tmp_dir, TERM_OFFSETS_FILE), term_offsets)
+    np.save(os.path.join(tmp_dir, POSTING_DOCS_FILE), _flatten(posting_docs))
+    np.save(os.path.join(tmp_dir, POSTING_TFS_FILE), _flatten(posting_tfs))
+    np.save(os.path.join(tmp_dir, DOC_LENS_FILE), np.frombuffer(doc_lens, dtype=np.int32))
+    np.save(os.path.join(tmp_dir, IDF_FILE), idf)
+
+    np.save(os.path.join(tmp_dir, TEXT_OFFSETS_FILE), np.frombuffer(text_offsets, dtype=np.int64))
+    np.save(os.path.join(tmp_dir, TOPIC_CODES_FILE), np.frombuffer(topic_codes, dtype=np.int32))
+    np.save(os.path.join(tmp_dir, SOURCE_CODES_FILE), np.frombuffer(source_codes, dtype=np.int32))
+    np.save(os.path.join(tmp_dir, PAGES_FILE), np.frombuffer(pages, dtype=np.int32))
+    # Fixed-width bytes, so the column can be memory-mapped like the others
+    np.save(os.path.join(tmp_dir, CHUNK_IDS_FILE), np.array([(c or "").encode("utf-8") for c in chunk_ids], dtype=np.bytes_))
+
+    for name, codes in ((TOPICS_FILE, topics), (SOURCES_FILE, sources)):
+        with open(os.path.join(tmp_dir, name), "w", encoding="utf-8") as f:
+            json.dump(list(codes), f, ensure_ascii=False)
+
+    terms = [None] * len(vocab)
+    for term, term_id in vocab.items():
+        terms[term_id] = term
+
+    with open(os.path.join(tmp_dir, VOCAB_FILE), "w", encoding="utf-8") as f:
+        json.dump(terms, f, ensure_ascii=False)
+
+    # Written last: a store without meta.json is treated as incomplete.
+    with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": STORE_VERSION,
+            "num_docs": num_docs,
+            "num_terms": len(terms),
+            "avgdl": avgdl,
+            "k1": K1,
+            "b": B,
+            "epsilon": EPSILON,
+            "analyzer": analyzer.config,
+        }, f, indent=2, ensure_ascii=False)
+
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+
+    return chunk_ids
+
+
+def _code(codes, value):
+    if value is None:
+        return -1
+    return codes.setdefault(value, len(codes))
+
+
+def compute_idf(doc_freqs, num_docs, epsilon=EPSILON):
+    """
+    BM25Okapi IDF: negative values are floored to epsilon * average idf.
+    """
+    idf = np.array(
+        [math.log(num_docs - n + 0.5) - math.log(n + 0.5) for n in doc_freqs.tolist()],
+        dtype=np.float64
+    )
+    if len(idf):
+        idf[idf < 0] = epsilon * (idf.sum() / len(idf))
+    return idf
+
+
+# ==========================================================
+# ---------------- LOAD (QUERY SIDE) -----------------------
+# ==========================================================
+
+class BM25Index:
+    """
+    Query side of a BM25 store. `analyzer` is rebuilt from the config the
+    store was indexed with; analyze queries with it, not a fresh one.
+    """
+
+    def __init__(self, meta, vocab, term_offsets, posting_docs, posting_tfs, doc_lens, idf):
+        self.num_docs = meta["num_docs"]
+        self.avgdl = meta["avgdl"]
+        self.k1 = meta["k1"]
+        self.b = meta["b"]
+        self.analyzer = get_analyzer(meta["analyzer"])
+
+        self.vocab = vocab
+        self.term_offsets = term_offsets
+        self.posting_docs = posting_docs
+        self.posting_tfs = posting_tfs
+        self.doc_lens = doc_lens
+        self.idf = idf
+
+    @classmethod
+    def load(cls, store_dir, mmap=True):
+        meta = read_meta(store_dir)
+        mmap_mode = "r" if mmap else None
+
+        with open(os.path.join(store_dir, VOCAB_FILE), encoding="utf-8") as f:
+            vocab = {term: term_id for term_id, term in enumerate(json.load(f))}
+
+        def _load(name):
+            return np.load(os.path.join(store_dir, name), mmap_mode=mmap_mode)
+
+        return cls(
+            meta,
+            vocab,
+            _load(TERM_OFFSETS_FILE),
+            _load(POSTING_DOCS_FILE),
+            _load(POSTING_TFS_FILE),
+            _load(DOC_LENS_FILE),
+            _load(IDF_FILE),
+        )
+
+    def get_scores(self, query_tokens):
+        """
+        Scores every document, walking only the posting lists of the query terms.
+        Matches BM25Okapi.get_scores on the same analyzed tokens.
+        """
+        scores = np.zeros(self.num_docs)
+
+        for term in query_tokens:
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.posting_docs[start:end]
+            tf = self.posting_tfs[start:end].astype(np.float64)
+            doc_len = self.doc_lens[docs]
+
+            scores[docs] += self.idf[term_id] * (
+                tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * doc_len / self.avgdl))
+            )
+
+        return scores
+
+    def top_k(self, query_tokens, k, doc_mask=None):
+        """
+        Returns (doc_ids, scores) of the k best documents, best first.
+        Only documents that contain a query term are scored; ties are broken
+        by lower doc id, which is the order BM25Okapi + a stable sort gives.
+        doc_mask: optional bool array over doc ids (see ChunkStore.filter_mask);
+        postings of other docs are dropped before scoring. IDF and avgdl stay
+        corpus-wide, so scores are comparable with unfiltered queries.
+        """
+        doc_parts = []
+        score_parts = []
+
+        for term in query_tokens:
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.posting_docs[start:end]
+            tf = self.posting_tfs[start:end]
+
+            if doc_mask is not None:
+                keep = doc_mask[docs]
+                docs, tf = docs[keep], tf[keep]
+
+            tf = tf.astype(np.float64)
+            doc_len = self.doc_lens[docs]
+
+            doc_parts.append(docs)
+            score_parts.append(self.idf[term_id] * (
+                tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * doc_len / self.avgdl))
+            ))
+
+        if not doc_parts or k <= 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+
+        # Accumulate per candidate in query-term order (same float sums as get_scores).
+        candidates, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+
+        if len(scores) > k:
+            kth_best = np.partition(scores, len(scores) - k)[len(scores) - k]
+            selected = np.flatnonzero(scores >= kth_best)
+        else:
+            selected = np.arange(len(scores))
+
+        order = np.lexsort((candidates[selected], -scores[selected]))[:k]
+        selected = selected[order]
+
+        return candidates[selected], scores[selected]
+
+    def score_upper_bound(self, query_tokens):
+        """
+        Highest score any document could get for this query (tf -> infinity
+        for every known term); used to normalize scores into [0, 1].
+        """
+        return sum(
+            float(self.idf[self.vocab[term]]) * (self.k1 + 1)
+            for term in query_tokens if term in self.vocab
+        )
+
+
+def read_meta(store_dir):
+    meta_path = os.path.join(store_dir, META_FILE)
+
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(
+            f"No BM25 store found at {store_dir}. Run `python ingest.py` first."
+        )
+
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+
+    if meta.get("version") != STORE_VERSION:
+        raise ValueError(
+            f"BM25 store at {store_dir} has version {meta.get('version')}, "
+            f"expected {STORE_VERSION}. Re-run `python ingest.py`."
+        )
+
+    return meta
+
+
+def store_is_current(store_dir):
+    try:
+        read_meta(store_dir)
+    except (FileNotFoundError, ValueError):
+        return False
+    return True
+
+
+# ==========================================================
+# ---------------- CHUNK STORAGE ---------------------------
+# ==========================================================
+
+def write_chunk(f, chunk):
+    f.write(json.dumps(
+        {"page_content": chunk.page_content, "metadata": chunk.metadata},
+        default=str
+    ) + "\n")
+
+
+def iter_chunks(path):
+    """
+    Streams Documents from a chunks JSONL file (an ingest spool).
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            yield Document(page_content=record["page_content"], metadata=record["metadata"])
+
+
+class ChunkStore:
+    """
+    Columnar, memory-mapped chunk storage shared by the BM25 and dense
+    retrievers: one UTF-8 text blob with offsets, integer-coded topic and
+    source_file columns, an int32 page column (-1 = unknown) and fixed-width
+    chunk IDs. Documents are built only for the rows asked for; the mapped
+    pages live in the OS page cache, shared by every process serving the store.
+    """
+
+    def __init__(self, store_dir):
+        read_meta(store_dir)
+
+        def _load(name):
+            return np.load(os.path.join(store_dir, name), mmap_mode="r")
+
+        self.text_offsets = _load(TEXT_OFFSETS_FILE)
+        self.topic_codes = _load(TOPIC_CODES_FILE)
+        self.source_codes = _load(SOURCE_CODES_FILE)
+        self.pages = _load(PAGES_FILE)
+        self.chunk_ids = _load(CHUNK_IDS_FILE)
+
+        with open(os.path.join(store_dir, TOPICS_FILE), encoding="utf-8") as f:
+            self.topics = json.load(f)
+        with open(os.path.join(store_dir, SOURCES_FILE), encoding="utf-8") as f:
+            self.sources = json.load(f)
+
+        with open(os.path.join(store_dir, TEXTS_FILE), "rb") as f:
+            self._texts = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.text_offsets[-1] else b""
+
+        self._topic_masks = {}
+
+    def __len__(self):
+        return len(self.text_offsets) - 1
+
+    def text(self, doc_id):
+        return self._texts[int(self.text_offsets[doc_id]):int(self.text_offsets[doc_id + 1])].decode("utf-8")
+
+    def metadata(self, doc_id):
+        topic = int(self.topic_codes[doc_id])
+        source = int(self.source_codes[doc_id])
+        page = int(self.pages[doc_id])
+        chunk_id = self.chunk_ids[doc_id].decode("utf-8")
+
+        return {
+            "topic": self.topics[topic] if topic >= 0 else None,
+            "source_file": self.sources[source] if source >= 0 else None,
+            "page_number": page if page >= 0 else None,
+            "chunk_id": chunk_id or None,
+        }
+
+    def __getitem__(self, doc_id):
+        return Document(page_content=self.text(doc_id), metadata=self.metadata(doc_id))
+
+    # ---------------- metadata filters ----------------
+
+    def topic_mask(self, topics):
+        """
+        Bool mask over doc ids of chunks in any of `topics`. Per-topic
+        bitmaps are built on first use and kept; unknown topics match nothing.
+        """
+        mask = np.zeros(len(self), dtype=bool)
+
+        for topic in topics:
+            if topic not in self.topics:
+                continue
+            code = self.topics.index(topic)
+            if code not in self._topic_masks:
+                self._topic_masks[code] = np.asarray(self.topic_codes) == code
+            mask |= self._topic_masks[code]
+
+        return mask
+
+    def source_mask(self, patterns):
+        """
+        Bool mask over doc ids whose source_file matches any glob in `patterns`.
+        Globs are matched against the (few) distinct file names, not per chunk.
+        """
+        codes = [
+            code for code, source in enumerate(self.sources)
+            if any(fnmatch.fnmatchcase(source, pattern) for pattern in patterns)
+        ]
+        return np.isin(np.asarray(self.source_codes), codes)
+
+    def filter_mask(self, topics=None, source_files=None):
+        """
+        AND of the topic and source_file filters; None when neither is given.
+        """
+        mask = None
+        if topics is not None:
+            mask = self.topic_mask(topics)
+        if source_files is not None:
+            sources = self.source_mask(source_files)
+            mask = sources if mask is None else mask & sources
+        return mask
+
+    def close(self):
+        if isinstance(self._texts, mmap.mmap):
+            self._texts.close()
+
+
+def iter_store_chunks(store_dir):
+    """
+    Streams every chunk of a store as a Document, then unmaps it
+    (so the store directory can be replaced, also on Windows).
+    """
+    store = ChunkStore(store_dir)
+    try:
+        for doc_id in range(len(store)):
+            yield store[doc_id]
+    finally:
+        store.close()
+
+
+def load_chunks(store_dir):
+    return list(iter_store_chunks(store_dir))
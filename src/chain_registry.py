@@ -0,0 +1,86 @@
+import os
+import threading
+
+from tracing import llm_call_counter
+
+
+# ==========================================================
+# ---------------- CHAIN REGISTRY --------------------------
+# ==========================================================
+#
+# One LLM client and one compiled chain per agent, per process.
+# The shared client keeps its HTTP connection pool to the local model
+# server alive, so repeated calls reuse open connections instead of
+# reconnecting, and prompt/structured-output wrappers are built once.
+# Every chain carries the tracing callback that counts LLM calls/tokens.
+
+# "default" = the model server client from query_analyzer_agent.load_llm,
+# "stub"    = deterministic local stand-in for load tests (see stub_llm.py)
+LLM_BACKEND = os.environ.get("VERITAS_LLM_BACKEND", "default")
+
+_lock = threading.RLock()
+_llm = None
+_chains = {}
+_stats = {"built": 0, "reused": 0}
+
+
+def get_llm():
+    global _llm
+
+    with _lock:
+        if _llm is None:
+            if LLM_BACKEND == "stub":
+                from stub_llm import load_stub_llm as load_llm
+            else:
+                from query_analyzer_agent import load_llm
+            _llm = load_llm()
+
+    return _llm
+
+
+def model_id():
+    """
+    Identifies the loaded model (e.g. for cache keys): its model name when
+    the client exposes one, else the client class.
+    """
+    llm = get_llm()
+    return getattr(llm, "model", None) or getattr(llm, "model_name", None) or type(llm).__name__
+
+
+def get_chain(name, factory):
+    """
+    Returns the chain registered under `name`, building it with
+    `factory(llm)` the first time it is requested.
+    """
+    with _lock:
+        chain = _chains.get(name)
+
+        if chain is None:
+            chain = factory(get_llm()).with_config(callbacks=[llm_call_counter])
+            _chains[name] = chain
+            _stats["built"] += 1
+        else:
+            _stats["reused"] += 1
+
+    return chain
+
+
+def registry_stats():
+    with _lock:
+        return {
+            "built": _stats["built"],
+            "reused": _stats["reused"],
+            "chains": sorted(_chains),
+        }
+
+
+def reset_registry():
+    """
+    Drops the cached client and chains (e.g. after switching models).
+    """
+    global _llm
+
+    with _lock:
+        _llm = None
+        _chains.clear()
+        _stats["built"] = _stats["reused"] = 0
@@ -0,0 +1,142 @@
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+# ==========================================================
+# ---------------------- CONFIG ----------------------------
+# ==========================================================
+
+CONTEXT_TOKEN_BUDGET = 1800     # context tokens sent to generation, IsSUP and revision
+TOKENIZER_ENCODING = "cl100k_base"
+CHARS_PER_TOKEN = 4             # fallback estimate when tiktoken is unavailable
+
+MIN_OVERLAP_CHARS = 20          # shorter shared text is treated as coincidence
+MAX_OVERLAP_CHARS = 200         # ingest.py uses CHUNK_OVERLAP = 100
+
+
+# ==========================================================
+# ---------------- TOKEN COUNTING --------------------------
+# ==========================================================
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception:
+            # The BPE file is downloaded on first use; offline, fall back for good.
+            _encoding = False
+
+    return _encoding or None
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(1, round(len(text) / CHARS_PER_TOKEN))
+
+
+def truncate_to_tokens(text, max_tokens):
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    return text[:max_tokens * CHARS_PER_TOKEN]
+
+
+# ==========================================================
+# ---------------- MERGING ---------------------------------
+# ==========================================================
+
+def join_overlapping(a, b):
+    """
+    `a` followed by `b` with their shared text written once, if `b` starts
+    with the end of `a` (consecutive splitter chunks) or one contains the
+    other. Otherwise None.
+    """
+    if b in a:
+        return a
+    if a in b:
+        return b
+
+    for size in range(min(len(a), len(b), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if a.endswith(b[:size]):
+            return a + b[size:]
+    return None
+
+
+def merge_page_texts(texts):
+    """
+    Merges the chunks of one page until no two overlap; pieces that
+    still do not overlap are kept, in their original order.
+    """
+    pieces = list(texts)
+
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(pieces)):
+            for j in range(len(pieces)):
+                joined = join_overlapping(pieces[i], pieces[j]) if i != j else None
+                if joined is not None:
+                    pieces[min(i, j)] = joined
+                    del pieces[max(i, j)]
+                    merged = True
+                    break
+            if merged:
+                break
+
+    return pieces
+
+
+# ==========================================================
+# ---------------- CONTEXT ASSEMBLY ------------------------
+# ==========================================================
+
+def page_blocks(docs):
+    """
+    One block per (topic, source_file, page), ranked by its best doc:
+    [(text, source_file, page_number)]. Chunks of the same page are merged,
+    with overlapping text deduplicated.
+    """
+    pages = {}
+    for doc in docs:
+        key = (doc.metadata.get("topic"), doc.metadata.get("source_file"), doc.metadata.get("page_number"))
+        pages.setdefault(key, []).append(doc.page_content)
+
+    return [
+        ("\n".join(merge_page_texts(texts)), source_file, page_number)
+        for (_, source_file, page_number), texts in pages.items()
+    ]
+
+
+def assemble_context(docs, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Builds the context string from relevance-ranked docs: merged page blocks
+    in rank order, each followed by its (Source, Page) line, packed greedily
+    up to `token_budget`. A block that does not fit is skipped in favour of
+    later, smaller ones; the top block is truncated rather than dropped.
+    """
+    blocks = []
+    used = 0
+
+    for rank, (text, source_file, page_number) in enumerate(page_blocks(docs)):
+        citation = f"\n(Source: {source_file}, Page: {page_number})"
+        cost = count_tokens(text + citation)
+
+        if used + cost > token_budget:
+            if rank > 0:
+                continue
+            text = truncate_to_tokens(text, max(token_budget - count_tokens(citation), 0))
+            cost = count_tokens(text + citation)
+
+        blocks.append(text + citation)
+        used += cost
+
+    return "\n\n".join(blocks)
@@ -1,10 +1,9 @@
 from pydantic import BaseModel,Field
 import json
-from langchain_ollama import OllamaLLM
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
-from query_analyzer_agent import load_llm
+from chain_registry import get_chain
 
 
 
@@ -15,16 +14,13 @@ class RetrieveDecision(BaseModel):
 
     )
 
-def decide_retrieval_func(user_query):
-    llm = load_llm()
-    user_query = user_query.strip()
-
+def build_decide_retrieval_chain(llm):
     decide_retrieval_prompt = PromptTemplate.from_template(
         """
         You decide whether retrieval is needed for the given query.
 
         Return JSON that matches this schema:
-        {"should_retrieve": boolean}
+        {{"should_retrieve": boolean}}
 
         GUIDELINES:
         - should_retrieve=True if answering requires specific facts, citations, or info likely not in the model.
@@ -38,9 +34,20 @@ def decide_retrieval_func(user_query):
 
     should_retrieve_llm = llm.with_structured_output(RetrieveDecision)
 
-    chain = decide_retrieval_prompt | should_retrieve_llm
+    return decide_retrieval_prompt | should_retrieve_llm
+
+def decide_retrieval_func(user_query):
+    user_query = user_query.strip()
+
+    chain = get_chain("decide_retrieval", build_decide_retrieval_chain)
 
     decision = chain.invoke({'user_query': user_query})
 
     return decision
 
+async def adecide_retrieval_func(user_query):
+    user_query = user_query.strip()
+
+    chain = get_chain("decide_retrieval", build_decide_retrieval_chain)
+
+    return await chain.ainvoke({'user_query': user_query})
@@ -0,0 +1,324 @@
+import json
+import math
+import os
+import pickle
+import time
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+
+
+# ==========================================================
+# ---------------------- CONFIG ----------------------------
+# ==========================================================
+#
+# ingest.py always maintains the exact flat store (index.faiss + index.pkl),
+# which supports incremental add/delete. When another index type is chosen,
+# an approximate index is rebuilt from the flat vectors after each run and
+# saved next to it as ann.faiss; the retriever loads it instead of the flat one.
+
+INDEX_TYPES = ["flat", "ivf_flat", "ivf_pq", "hnsw", "sq8"]
+
+FLAT_INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "index.pkl"
+ANN_INDEX_FILE = "ann.faiss"
+ANN_META_FILE = "ann_meta.json"
+ROW_MAP_FILE = "row_to_chunk.npy"    # FAISS row -> BM25/chunk store doc id
+
+# Build-time parameters
+NLIST = None              # IVF cells; None = 4 * sqrt(n), capped so each cell gets ~39 training points
+PQ_M = 48                 # IVF-PQ sub-quantizers (must divide the dimension: 384 / 48 = 8 dims each)
+PQ_NBITS = 8
+HNSW_M = 32               # HNSW graph degree
+HNSW_EF_CONSTRUCTION = 200
+MAX_TRAIN_POINTS = 100_000
+ADD_BATCH = 65536
+
+# Query-time parameters
+NPROBE = 16               # IVF cells scanned per query
+EF_SEARCH = 64            # HNSW candidate list size
+
+
+def default_nlist(num_vectors):
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+
+def factory_string(index_type, dim, num_vectors, nlist=NLIST, pq_m=PQ_M, hnsw_m=HNSW_M):
+    """
+    (faiss.index_factory description, build params) for an index type.
+    """
+    if index_type in ("ivf_flat", "ivf_pq"):
+        # IVF training needs at least one vector per cell
+        nlist = min(nlist or default_nlist(num_vectors), max(num_vectors, 1))
+
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat", {"nlist": nlist}
+
+    if index_type == "ivf_pq":
+        if dim % pq_m:
+            raise ValueError(f"PQ_M={pq_m} must divide the embedding dimension {dim}")
+        if num_vectors < 2 ** PQ_NBITS:
+            raise ValueError(f"IVF-PQ needs at least {2 ** PQ_NBITS} vectors to train, got {num_vectors}")
+        return f"IVF{nlist},PQ{pq_m}x{PQ_NBITS}", {"nlist": nlist, "pq_m": pq_m, "pq_nbits": PQ_NBITS}
+
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m},Flat", {"hnsw_m": hnsw_m, "ef_construction": HNSW_EF_CONSTRUCTION}
+
+    if index_type == "sq8":
+        return "SQ8", {}
+
+    raise ValueError(f"unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+
+
+# ==========================================================
+# ---------------- BUILD -----------------------------------
+# ==========================================================
+
+def build_ann_index(flat_index, index_type, nlist=NLIST, pq_m=PQ_M, hnsw_m=HNSW_M, seed=0):
+    """
+    Trains (on a random sample of at most MAX_TRAIN_POINTS) and fills an index
+    of `index_type` with the flat index's vectors, in the same row order, so
+    the flat store's row -> chunk mapping stays valid.
+    Returns (index, meta).
+    """
+    num_vectors, dim = flat_index.ntotal, flat_index.d
+    factory, params = factory_string(index_type, dim, num_vectors, nlist, pq_m, hnsw_m)
+
+    start = time.perf_counter()
+    index = faiss.index_factory(dim, factory, faiss.METRIC_L2)
+
+    if index_type == "hnsw":
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+
+    train_points = 0
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(num_vectors, size=min(num_vectors, MAX_TRAIN_POINTS), replace=False))
+        index.train(flat_index.reconstruct_batch(sample.astype(np.int64)))
+        train_points = len(sample)
+
+    for first in range(0, num_vectors, ADD_BATCH):
+        index.add(flat_index.reconstruct_n(first, min(ADD_BATCH, num_vectors - first)))
+
+    meta = {
+        "index_type": index_type,
+        "factory": factory,
+        "params": params,
+        "ntotal": num_vectors,
+        "dim": dim,
+        "train_points": train_points,
+        "build_seconds": round(time.perf_counter() - start, 2),
+    }
+    return index, meta
+
+
+def write_ann_index(index, meta, vector_db_dir):
+    """
+    Writes ann.faiss + ann_meta.json, each via a temp file and atomic rename.
+    """
+    index_path = os.path.join(vector_db_dir, ANN_INDEX_FILE)
+    meta_path = os.path.join(vector_db_dir, ANN_META_FILE)
+
+    faiss.write_index(index, index_path + ".tmp")
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    os.replace(index_path + ".tmp", index_path)
+    os.replace(meta_path + ".tmp", meta_path)
+
+
+def remove_ann_index(vector_db_dir):
+    for name in (ANN_META_FILE, ANN_INDEX_FILE):
+        path = os.path.join(vector_db_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def remove_dense_store(vector_db_dir):
+    """
+    Deletes the flat store, row map and approximate index, e.g. when a full
+    build produced no chunks, so no stale index outlives its chunk store.
+    """
+    remove_ann_index(vector_db_dir)
+    for name in (FLAT_INDEX_FILE, DOCSTORE_FILE, ROW_MAP_FILE):
+        path = os.path.join(vector_db_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def write_row_map(vectorstore, chunk_ids, vector_db_dir):
+    """
+    Maps every FAISS row to its doc id in the chunk store (`chunk_ids` in
+    doc-id order), so the retriever can resolve dense hits without
+    unpickling the LangChain docstore.
+    """
+    position = {chunk_id: doc_id for doc_id, chunk_id in enumerate(chunk_ids)}
+    row_map = np.fromiter(
+        (position[vectorstore.index_to_docstore_id[row]] for row in range(vectorstore.index.ntotal)),
+        dtype=np.int32,
+        count=vectorstore.index.ntotal
+    )
+
+    path = os.path.join(vector_db_dir, ROW_MAP_FILE)
+    np.save(path + ".tmp.npy", row_map)
+    os.replace(path + ".tmp.npy", path)
+
+
+def index_size_mb(index):
+    return faiss.serialize_index(index).nbytes / (1024 * 1024)
+
+
+# ==========================================================
+# ---------------- LOAD / SEARCH PARAMS --------------------
+# ==========================================================
+
+def read_ann_meta(vector_db_dir):
+    meta_path = os.path.join(vector_db_dir, ANN_META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ChunkDocstore(Docstore):
+    """
+    Read-only LangChain docstore over a bm25_index.ChunkStore; paired with
+    the row map as index_to_docstore_id.
+    """
+
+    def __init__(self, chunk_store):
+        self.chunk_store = chunk_store
+
+    def search(self, search):
+        return self.chunk_store[int(search)]
+
+
+def read_index(path, mmap=True):
+    """
+    IO_FLAG_MMAP_IFC (newer FAISS) maps flat/SQ/PQ codes and IVF inverted
+    lists from the file; older builds only have IO_FLAG_MMAP, which maps the
+    inverted lists. The two must not be combined: with IO_FLAG_READ_ONLY,
+    reading an IVF index fails when both are set. Whatever is still read
+    into the heap is never written at search time, so pre-forked workers
+    keep sharing it copy-on-write.
+    """
+    if not mmap:
+        return faiss.read_index(path)
+
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None) or faiss.IO_FLAG_MMAP
+    return faiss.read_index(path, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+
+
+def load_dense_store(vector_db_dir, embeddings, index_type="auto", chunk_store=None):
+    """
+    Returns (FAISS vectorstore, ann meta or None).
+    index_type: "auto" (the approximate index if one was built, else flat),
+    "flat", or a specific type from INDEX_TYPES (must match what was built).
+    With a chunk_store and the row map written by ingest.py, the index is
+    memory-mapped and hits resolve through the chunk store; otherwise the
+    LangChain docstore pickle is loaded (ingest.py's only holds chunk IDs).
+    The flat index file is not read when an approximate index is used.
+    """
+    meta = read_ann_meta(vector_db_dir) if index_type != "flat" else None
+
+    if meta is None and index_type not in ("auto", "flat"):
+        raise FileNotFoundError(f"No {index_type} index in {vector_db_dir}; run ingest.py --index-type {index_type}")
+
+    if meta is not None and index_type != "auto" and meta["index_type"] != index_type:
+        raise ValueError(f"{vector_db_dir} holds a {meta['index_type']} index, not {index_type}")
+
+    row_map_path = os.path.join(vector_db_dir, ROW_MAP_FILE)
+
+    if chunk_store is not None and os.path.exists(row_map_path):
+        row_map = np.load(row_map_path, mmap_mode="r")
+
+        if meta is not None and meta["ntotal"] != len(row_map):
+            print(f"⚠️ {ANN_INDEX_FILE} is out of date with the flat store; using the flat index.")
+            meta = None
+
+        index = read_index(os.path.join(vector_db_dir, ANN_INDEX_FILE if meta else FLAT_INDEX_FILE))
+        return FAISS(embeddings, index, ChunkDocstore(chunk_store), row_map), meta
+
+    if meta is None:
+        return FAISS.load_local(vector_db_dir, embeddings, allow_dangerous_deserialization=True), None
+
+    with open(os.path.join(vector_db_dir, DOCSTORE_FILE), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    if meta["ntotal"] != len(index_to_docstore_id):
+        print(f"⚠️ {ANN_INDEX_FILE} is out of date with the flat store; using the flat index.")
+        return FAISS.load_local(vector_db_dir, embeddings, allow_dangerous_deserialization=True), None
+
+    index = faiss.read_index(os.path.join(vector_db_dir, ANN_INDEX_FILE))
+    return FAISS(embeddings, index, docstore, index_to_docstore_id), meta
+
+
+def set_search_params(index, meta, nprobe=None, ef_search=None):
+    """
+    Applies query-time knobs; a no-op for flat and SQ8 indexes.
+    """
+    if meta is None:
+        return
+
+    if meta["index_type"] in ("ivf_flat", "ivf_pq") and nprobe:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+
+    if meta["index_type"] == "hnsw" and ef_search:
+        index.hnsw.efSearch = ef_search
+
+
+# ==========================================================
+# ---------------- FILTERED SEARCH -------------------------
+# ==========================================================
+
+def id_selector(row_mask):
+    """
+    FAISS IDSelectorBitmap over the rows where `row_mask` is set.
+    """
+    bits = np.packbits(row_mask, bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(row_mask), faiss.swig_ptr(bits))
+    selector.referenced_objects = [bits]     # keep the buffer alive with the selector
+    return selector
+
+
+def search_parameters(index, meta, selector):
+    """
+    Per-query parameters carrying the selector. They replace the index-level
+    knobs for that search, so the current nprobe / efSearch are copied in.
+    """
+    index_type = meta["index_type"] if meta else "flat"
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=faiss.extract_index_ivf(index).nprobe)
+    if index_type == "hnsw":
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def doc_mask_to_selector(vectorstore, doc_mask):
+    """
+    Translates a bool mask over chunk-store doc ids into a selector over
+    FAISS rows, through the row map. Needs the mmap-loaded store.
+    """
+    if not isinstance(vectorstore.docstore, ChunkDocstore):
+        raise ValueError(f"Metadata filters need {ROW_MAP_FILE}; re-run ingest.py to write it.")
+
+    return id_selector(doc_mask[np.asarray(vectorstore.index_to_docstore_id)])
+
+
+def search_with_selector(vectorstore, meta, query_vector, k, selector):
+    """
+    [(doc, L2 distance)] best first among the selected rows. The selector is
+    applied inside the FAISS search, so rows outside it are never scored
+    (IVF still probes nprobe cells, HNSW may return fewer than k hits).
+    """
+    params = search_parameters(vectorstore.index, meta, selector)
+    distances, rows = vectorstore.index.search(np.asarray([query_vector], dtype=np.float32), k, params=params)
+
+    return [
+        (vectorstore.docstore.search(vectorstore.index_to_docstore_id[row]), float(distance))
+        for distance, row in zip(distances[0], rows[0])
+        if row >= 0
+    ]
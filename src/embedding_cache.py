@@ -0,0 +1,314 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# ==========================================================
+# ---------------------- CONFIG ----------------------------
+# ==========================================================
+
+MEMORY_ITEMS = 20000   # in-process LRU capacity (vectors)
+
+MAX_RECORDS = 250_000  # disk store cap (~390 MB at 384 dims); past it the file is compacted
+COMPACT_TO = 200_000   # newest distinct records kept by a compaction
+
+RECORDS_FILE = "records.bin"
+LOCK_FILE = "records.lock"
+META_FILE = "meta.json"
+
+
+def text_key(model_name, kind, text):
+    """
+    20-byte content address: model + "query"/"document" + text.
+    """
+    return hashlib.sha1(f"{model_name}\0{kind}\0{text}".encode("utf-8")).digest()
+
+
+# ==========================================================
+# ---------------- DISK STORE ------------------------------
+# ==========================================================
+
+@contextmanager
+def file_lock(path):
+    """
+    Exclusive inter-process lock on a sidecar file (flock, or msvcrt.locking
+    on Windows). Serializes writers across server workers and ingest runs.
+    """
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class EmbeddingStore:
+    """
+    Append-only file of fixed-size (key, float32[dim]) records, read through
+    a memory map. One file keeps keys and vectors aligned even if a write is
+    cut short; a partial trailing record is truncated before the next append.
+
+    Safe to share between processes: appends and compactions happen under
+    file_lock, and every reader indexes rows from the file itself (refresh),
+    so rows appended by other processes are found and none are ever claimed
+    twice. A compaction replaces the file; readers notice the new inode and
+    re-index from scratch.
+    """
+
+    def __init__(self, store_dir, dim, max_records=MAX_RECORDS, compact_to=COMPACT_TO):
+        os.makedirs(store_dir, exist_ok=True)
+
+        self.path = os.path.join(store_dir, RECORDS_FILE)
+        self.lock_path = os.path.join(store_dir, LOCK_FILE)
+        self.dtype = np.dtype([("key", "S20"), ("vec", "<f4", (dim,))])
+        self.max_records = max_records
+        self.compact_to = min(compact_to, max_records)
+
+        self.rows = {}
+        self._records = None
+        self._mapped_rows = 0
+        self._file_id = None
+
+        with file_lock(self.lock_path):
+            self._check_meta(store_dir, dim)
+            if os.path.exists(self.path):
+                with open(self.path, "ab") as f:
+                    self._truncate_partial(f)
+                if os.path.getsize(self.path) // self.dtype.itemsize > self.max_records:
+                    self._compact()
+
+        self.refresh()
+
+    def _check_meta(self, store_dir, dim):
+        meta_path = os.path.join(store_dir, META_FILE)
+
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                if json.load(f)["dim"] == dim:
+                    return
+            # Different dimensionality: the old records are unusable.
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": dim}, f)
+
+    def _truncate_partial(self, f):
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size % self.dtype.itemsize:
+            f.truncate(size - size % self.dtype.itemsize)
+
+    def refresh(self):
+        """
+        Maps and indexes records appended since the last call, by this or any
+        other process. Returns True if new rows were found.
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return False
+
+        with f:
+            stat = os.fstat(f.fileno())
+            if stat.st_ino != self._file_id:
+                # First open, or another process compacted the file.
+                self.rows = {}
+                self._records = None
+                self._mapped_rows = 0
+                self._file_id = stat.st_ino
+
+            rows = stat.st_size // self.dtype.itemsize
+            if rows <= self._mapped_rows:
+                return False
+
+            self._records = np.memmap(f, dtype=self.dtype, mode="r", shape=(rows,))
+
+        for row, key in enumerate(self._records["key"][self._mapped_rows:], start=self._mapped_rows):
+            self.rows[bytes(key)] = row
+        self._mapped_rows = rows
+        return True
+
+    def get(self, key):
+        row = self.rows.get(key)
+        if row is None and self.refresh():
+            row = self.rows.get(key)
+        if row is None:
+            return None
+        return np.array(self._records["vec"][row])
+
+    def put_many(self, keys, vectors):
+        """
+        Appends the records for keys no process has stored yet. Row numbers
+        are never computed here: refresh() reads them back from the file.
+        """
+        records = np.empty(len(keys), dtype=self.dtype)
+        records["key"] = keys
+        records["vec"] = vectors
+
+        with file_lock(self.lock_path):
+            self.refresh()
+            new = [i for i, key in enumerate(keys) if key not in self.rows]
+            if not new:
+                return
+
+            with open(self.path, "ab") as f:
+                self._truncate_partial(f)
+                f.write(records[new].tobytes())
+
+            self.refresh()
+            if self._mapped_rows > self.max_records:
+                self._compact()
+                self.refresh()
+
+    def _compact(self):
+        """
+        Rewrites the file with the newest `compact_to` distinct records.
+        Called under file_lock. On Windows, replacing a file another process
+        still has mapped fails; the compaction is then left for a later write.
+        """
+        records = np.memmap(self.path, dtype=self.dtype, mode="r")
+        keys = records["key"]
+
+        seen = set()
+        keep = []
+        for row in range(len(records) - 1, -1, -1):
+            key = bytes(keys[row])
+            if key not in seen:
+                seen.add(key)
+                keep.append(row)
+                if len(keep) == self.compact_to:
+                    break
+        keep.reverse()
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for start in range(0, len(keep), 10_000):
+                f.write(records[keep[start:start + 10_000]].tobytes())
+
+        del records, keys
+        self._records = None
+        self._file_id = None
+        try:
+            os.replace(tmp_path, self.path)
+        except OSError:
+            os.remove(tmp_path)
+
+
+# ==========================================================
+# ---------------- CACHED EMBEDDINGS -----------------------
+# ==========================================================
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings model with a content-addressed cache:
+    in-memory LRU -> memory-mapped disk store -> the model itself.
+    Used by ingest (chunk texts) and by the retriever (queries).
+    """
+
+    def __init__(self, underlying, model_name, cache_dir, memory_items=MEMORY_ITEMS):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.store_dir = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        self.memory_items = memory_items
+
+        self._memory = OrderedDict()
+        self._store = None
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def embed_documents(self, texts):
+        return self._embed(texts, "document", self.underlying.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed([text], "query", lambda texts: [self.underlying.embed_query(texts[0])])[0]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = sum(stats.values())
+        stats["hit_ratio"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def open_store(self):
+        """
+        Opens the disk store eagerly (otherwise it opens on the first miss,
+        once the embedding dimension is known).
+        """
+        meta_path = os.path.join(self.store_dir, META_FILE)
+        if self._store is None and os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                self._store = EmbeddingStore(self.store_dir, json.load(f)["dim"])
+        return self
+
+    # ---------------- internals ----------------
+
+    def _embed(self, texts, kind, compute):
+        keys = [text_key(self.model_name, kind, text) for text in texts]
+        vectors = [None] * len(texts)
+        missing = []
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                elif self._store is not None and (vector := self._store.get(key)) is not None:
+                    self._remember(key, vector)
+                    self._stats["disk_hits"] += 1
+                else:
+                    missing.append(i)
+                    self._stats["misses"] += 1
+                vectors[i] = vector
+
+        if missing:
+            # Duplicate texts inside one call are computed once.
+            unique = list(dict.fromkeys(keys[i] for i in missing))
+            first_index = {}
+            for i in missing:
+                first_index.setdefault(keys[i], i)
+
+            computed = np.asarray(compute([texts[first_index[key]] for key in unique]), dtype=np.float32)
+
+            with self._lock:
+                if self._store is None:
+                    self._store = EmbeddingStore(self.store_dir, computed.shape[1])
+                new = [(key, vec) for key, vec in zip(unique, computed) if key not in self._store.rows]
+                if new:
+                    self._store.put_many([key for key, _ in new], np.stack([vec for _, vec in new]))
+                for key, vec in zip(unique, computed):
+                    self._remember(key, vec)
+
+            by_key = dict(zip(unique, computed))
+            for i in missing:
+                vectors[i] = by_key[keys[i]]
+
+        return [vector.tolist() for vector in vectors]
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
@@ -1,14 +1,11 @@
 from pydantic import BaseModel,Field
 import json
-from langchain_ollama import OllamaLLM
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
-from query_analyzer_agent import load_llm
-
-def generate_from_context(user_query, context):
-    llm = load_llm()
+from chain_registry import get_chain
 
+def build_generate_from_context_chain(llm):
     rag_generation_prompt=PromptTemplate.from_template(
         """
       You are a Chemical Engineering Knowledge Generator Agent operating 
@@ -73,10 +70,26 @@ def generate_from_context(user_query, context):
 
     )
 
-    chain=rag_generation_prompt | llm | StrOutputParser()
+    return rag_generation_prompt | llm | StrOutputParser()
+
+def generate_from_context(user_query, context):
+    chain=get_chain("generate_from_context", build_generate_from_context_chain)
     result=chain.invoke({"query":user_query,"context":context})
 
     return result
 
+async def agenerate_from_context(user_query, context):
+    chain=get_chain("generate_from_context", build_generate_from_context_chain)
+    return await chain.ainvoke({"query":user_query,"context":context})
 
+def stream_generate_from_context(user_query, context):
+    """
+    Yields the grounded answer as it is generated.
+    """
+    chain=get_chain("generate_from_context", build_generate_from_context_chain)
+    yield from chain.stream({"query":user_query,"context":context})
 
+async def astream_generate_from_context(user_query, context):
+    chain=get_chain("generate_from_context", build_generate_from_context_chain)
+    async for chunk in chain.astream({"query":user_query,"context":context}):
+        yield chunk
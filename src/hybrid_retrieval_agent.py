@@ -1,139 +1,415 @@
 import os
+import threading
+from collections import OrderedDict
 from typing import List
 
+import numpy as np
+
 from langchain_core.documents import Document
-from rank_bm25 import BM25Okapi
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.document_loaders import PyPDFLoader
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from bm25_index import BM25Index, ChunkStore
+from embedding_cache import CachedEmbeddings
 
 
 # ==========================================================
 # ---------------------- CONFIG ----------------------------
 # ==========================================================
 
-DATA_DIR = r"D:\AdvancedML\MultiAgent_HybridRAG_ChemicalEngineering\data"
-VECTOR_DB_DIR = r"D:\AdvancedML\MultiAgent_HybridRAG_ChemicalEngineering\embeddings\vectorstore"
+VECTOR_DB_DIR = os.environ.get(
+    "VERITAS_VECTOR_DB_DIR",
+    r"D:\AdvancedML\MultiAgent_HybridRAG_ChemicalEngineering\embeddings\vectorstore"
+)
+BM25_STORE_DIR = os.path.join(VECTOR_DB_DIR, "bm25")
+# "minilm", or "hashing" for fully offline runs (load tests on the synthetic corpus)
+EMBEDDINGS_BACKEND = os.environ.get("VERITAS_EMBEDDINGS", "minilm")
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_CACHE_DIR = os.path.join(os.path.dirname(VECTOR_DB_DIR), "embedding_cache")
 
-CHUNK_SIZE = 800
-CHUNK_OVERLAP = 100
+# "auto" = the approximate index ingest.py built (ivf_flat/ivf_pq/hnsw/sq8), else flat
+DENSE_INDEX_TYPE = "auto"
 
 TOP_K_DENSE = 4
 TOP_K_BM25 = 4
 
+# "rrf" (reciprocal rank fusion) or "weighted" (min-max normalized scores)
+FUSION_METHOD = "rrf"
+RRF_K = 60
+DENSE_WEIGHT = 0.5
+BM25_WEIGHT = 0.5
+TOP_N_FUSED = 5
+
+# Metadata filters: {"topic": "distillation" | [...], "source_file": "glob*.pdf" | [...]}
+FILTER_CACHE_SIZE = 64              # resolved filters (doc masks + FAISS selectors) kept
+
+# Topic routing: a naive Bayes classifier over the query terms' BM25 postings
+TOPIC_MIN_CONFIDENCE = 0.6          # route only when the best topic has at least this posterior
+TOPIC_COVERAGE = 0.9                # keep the likeliest topics until they cover this much posterior
+TOPIC_MAX_TOPICS = 2
+TOPIC_SMOOTHING = 1.0               # additive (Laplace) smoothing of term counts
+
 
 # ==========================================================
 # ---------------- DENSE RETRIEVER -------------------------
 # ==========================================================
 
-def load_dense_retriever():
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
+def load_embeddings():
+    """
+    MiniLM behind the shared embedding cache, so a query embedded once
+    (retrieval signals, dense search, answer cache, rewrite loops) is reused.
+    """
+    if EMBEDDINGS_BACKEND == "hashing":
+        from synthetic_corpus import HashingEmbeddings
+        return HashingEmbeddings()
 
-    vectorstore = FAISS.load_local(
-        VECTOR_DB_DIR,
-        embeddings,
-        allow_dangerous_deserialization=True
-    )
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    return CachedEmbeddings(
+        HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL),
+        EMBEDDING_MODEL,
+        EMBEDDING_CACHE_DIR
+    ).open_store()
 
-    return vectorstore.as_retriever(search_kwargs={"k": TOP_K_DENSE})
+
+def load_vectorstore(vector_db_dir=VECTOR_DB_DIR, embeddings=None, index_type=DENSE_INDEX_TYPE, chunk_store=None):
+    """
+    Returns (vectorstore, ann meta or None); see dense_index.load_dense_store.
+    """
+    from dense_index import load_dense_store
+
+    return load_dense_store(vector_db_dir, embeddings or load_embeddings(), index_type, chunk_store)
+
+
+def retrieve_dense(query, vectorstore, k=TOP_K_DENSE):
+    """
+    Returns [(doc, score)] best first; score is the negated L2 distance
+    so that, like BM25, higher is better.
+    """
+    return [
+        (doc, -float(distance))
+        for doc, distance in vectorstore.similarity_search_with_score(query, k=k)
+    ]
 
 
 # ==========================================================
 # ---------------- BM25 SETUP ------------------------------
 # ==========================================================
 
-def load_and_chunk_documents():
-    documents = []
+def load_bm25_index(store_dir=BM25_STORE_DIR):
+    """
+    Loads the BM25 artifact written by ingest.py. Postings and chunks are
+    memory-mapped, so processes serving the same store share its pages.
+    """
+    return BM25Index.load(store_dir), ChunkStore(store_dir)
 
-    for topic in os.listdir(DATA_DIR):
-        topic_path = os.path.join(DATA_DIR, topic)
 
-        if not os.path.isdir(topic_path):
-            continue
+def retrieve_bm25(query, bm25, chunks, k=TOP_K_BM25, doc_mask=None):
+    """
+    Returns [(doc, bm25 score)] best first, among the docs in `doc_mask` if given.
+    """
+    doc_ids, scores = bm25.top_k(bm25.analyzer(query), k, doc_mask)
+    return [(chunks[i], float(score)) for i, score in zip(doc_ids, scores)]
+
 
-        for file in os.listdir(topic_path):
-            if file.endswith(".pdf"):
-                loader = PyPDFLoader(os.path.join(topic_path, file))
-                pages = loader.load()
+# ==========================================================
+# ---------------- FILTERS / TOPIC ROUTING -----------------
+# ==========================================================
 
-                for page in pages:
-                    page.metadata["topic"] = topic
-                    page.metadata["source_file"] = file
-                    page.metadata["page_number"] = page.metadata.get("page", None)
+def normalize_filters(filters):
+    """
+    (topics, source_file globs) as sorted tuples or None; hashable, for caching.
+    """
+    if not filters:
+        return None, None
+
+    unknown = set(filters) - {"topic", "source_file"}
+    if unknown:
+        raise ValueError(f"Unknown filter keys: {sorted(unknown)}; expected topic, source_file")
+
+    def _values(value):
+        if value is None:
+            return None
+        return tuple(sorted({value} if isinstance(value, str) else set(value)))
+
+    return _values(filters.get("topic")), _values(filters.get("source_file"))
+
+
+class TopicClassifier:
+    """
+    Multinomial naive Bayes over topics, using only what the BM25 store
+    already has: per-topic token totals come from doc lengths, and the
+    query terms' counts per topic from their posting lists. No model, no
+    training step; costs about one BM25 posting walk.
+    """
+
+    def __init__(self, bm25, chunk_store, smoothing=TOPIC_SMOOTHING):
+        self.bm25 = bm25
+        self.topics = chunk_store.topics
+        self.topic_codes = np.asarray(chunk_store.topic_codes)
+        self.smoothing = smoothing
+
+        labelled = self.topic_codes >= 0
+        n_topics = len(self.topics)
+        doc_counts = np.bincount(self.topic_codes[labelled], minlength=n_topics)
+        token_counts = np.bincount(self.topic_codes[labelled], weights=np.asarray(bm25.doc_lens)[labelled], minlength=n_topics)
+
+        self.log_prior = np.log((doc_counts + 1) / (doc_counts.sum() + n_topics))
+        self.log_denominator = np.log(token_counts + smoothing * max(len(bm25.vocab), 1))
+
+    def posterior(self, query_tokens):
+        """
+        P(topic | query) for every topic, or None if no query term is indexed.
+        """
+        if not self.topics:
+            return None
+
+        log_p = self.log_prior.copy()
+        known = 0
+
+        for term in query_tokens:
+            term_id = self.bm25.vocab.get(term)
+            if term_id is None:
+                continue
+            known += 1
+
+            start, end = self.bm25.term_offsets[term_id], self.bm25.term_offsets[term_id + 1]
+            codes = self.topic_codes[self.bm25.posting_docs[start:end]]
+            tf = self.bm25.posting_tfs[start:end]
+            counts = np.bincount(codes[codes >= 0], weights=tf[codes >= 0], minlength=len(self.topics))
+
+            log_p += np.log(counts + self.smoothing) - self.log_denominator
+
+        if not known:
+            return None
+
+        p = np.exp(log_p - log_p.max())
+        return p / p.sum()
+
+    def route(self, query_tokens, min_confidence=TOPIC_MIN_CONFIDENCE, coverage=TOPIC_COVERAGE, max_topics=TOPIC_MAX_TOPICS):
+        """
+        The likeliest topics (at most `max_topics`, until `coverage` posterior),
+        or None when the best topic is below `min_confidence`.
+        """
+        p = self.posterior(query_tokens)
+        if p is None:
+            return None
+
+        order = np.argsort(-p)
+        if p[order[0]] < min_confidence:
+            return None
+
+        topics, covered = [], 0.0
+        for code in order[:max_topics]:
+            topics.append(self.topics[code])
+            covered += p[code]
+            if covered >= coverage:
+                break
+        return topics
 
-                documents.extend(pages)
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP
-    )
+# ==========================================================
+# ---------------- FUSION ----------------------------------
+# ==========================================================
 
-    return splitter.split_documents(documents)
+def chunk_key(doc):
+    chunk_id = doc.metadata.get("chunk_id")
+    if chunk_id is not None:
+        return chunk_id
 
+    # Stores built before chunk IDs existed
+    return (
+        doc.metadata.get("source_file"),
+        doc.metadata.get("page_number"),
+        doc.page_content[:50]
+    )
 
-def build_bm25_index(chunks):
-    corpus = [chunk.page_content for chunk in chunks]
-    tokenized_corpus = [doc.lower().split() for doc in corpus]
-    bm25 = BM25Okapi(tokenized_corpus)
-    return bm25, chunks
 
+def fuse_results(ranked_lists, weights, method=FUSION_METHOD, rrf_k=RRF_K, top_n=TOP_N_FUSED):
+    """
+    Fuses several [(doc, score)] lists (best first, higher score = better)
+    into one list of at most `top_n` docs, best first, deduplicated by chunk ID.
 
-def retrieve_bm25(query, bm25, chunks):
-    tokenized_query = query.lower().split()
-    scores = bm25.get_scores(tokenized_query)
+    rrf:      sum of weight / (rrf_k + rank)
+    weighted: sum of weight * min-max normalized score
+    """
+    fused = {}
+    docs = {}
 
-    top_indices = sorted(
-        range(len(scores)),
-        key=lambda i: scores[i],
-        reverse=True
-    )[:TOP_K_BM25]
+    for ranked, weight in zip(ranked_lists, weights):
+        if not ranked:
+            continue
 
-    return [chunks[i] for i in top_indices]
+        scores = [score for _, score in ranked]
+        low, high = min(scores), max(scores)
 
+        for rank, (doc, score) in enumerate(ranked, start=1):
+            if method == "rrf":
+                contribution = weight / (rrf_k + rank)
+            elif method == "weighted":
+                contribution = weight * ((score - low) / (high - low) if high > low else 1.0)
+            else:
+                raise ValueError(f"Unknown fusion method: {method}")
 
-# ==========================================================
-# ---------------- MERGE & FORMAT --------------------------
-# ==========================================================
+            key = chunk_key(doc)
+            fused[key] = fused.get(key, 0.0) + contribution
+            docs.setdefault(key, doc)
 
-def merge_results(dense_docs, bm25_docs):
-    combined = dense_docs + bm25_docs
+    ranked_keys = sorted(fused, key=lambda key: fused[key], reverse=True)[:top_n]
 
-    unique = {}
-    for doc in combined:
-        key = (
-            doc.metadata.get("source_file"),
-            doc.metadata.get("page_number"),
-            doc.page_content[:50]
+    return [
+        Document(
+            page_content=docs[key].page_content,
+            metadata={**docs[key].metadata, "fusion_score": fused[key]}
         )
-        unique[key] = doc
+        for key in ranked_keys
+    ]
 
-    return list(unique.values())
 
 class HybridRetrievalAgent:
 
-    def __init__(self):
+    def __init__(
+        self,
+        vector_db_dir=VECTOR_DB_DIR,
+        embeddings=None,
+        fusion_method=FUSION_METHOD,
+        top_n=TOP_N_FUSED,
+        k_dense=TOP_K_DENSE,
+        k_bm25=TOP_K_BM25,
+        index_type=DENSE_INDEX_TYPE,
+        nprobe=None,
+        ef_search=None
+    ):
         print("Initializing Hybrid Retrieval Agent...")
 
-        self.dense_retriever = load_dense_retriever()
-        self.bm25_chunks = load_and_chunk_documents()
-        self.bm25, self.bm25_chunks = build_bm25_index(self.bm25_chunks)
-
-    def retrieve(self, query: str) -> List[Document]:
-
+        self.fusion_method = fusion_method
+        self.top_n = top_n
+        self.k_dense = k_dense
+        self.k_bm25 = k_bm25
 
+        self.bm25, self.bm25_chunks = load_bm25_index(os.path.join(vector_db_dir, "bm25"))
+        self.vectorstore, self.dense_index_meta = load_vectorstore(
+            vector_db_dir, embeddings, index_type, chunk_store=self.bm25_chunks
+        )
+        self.embeddings = self.vectorstore.embeddings
+
+        self._filters = OrderedDict()
+        self._filters_lock = threading.Lock()
+        self._topic_classifier = None
+
+        from dense_index import EF_SEARCH, NPROBE
+        self.set_search_params(nprobe or NPROBE, ef_search or EF_SEARCH)
+
+    @property
+    def dense_index_type(self):
+        return self.dense_index_meta["index_type"] if self.dense_index_meta else "flat"
+
+    def set_search_params(self, nprobe=None, ef_search=None):
+        """
+        Recall/latency knobs of an approximate dense index (nprobe for IVF,
+        efSearch for HNSW). Applies to every subsequent query.
+        """
+        from dense_index import set_search_params
+
+        set_search_params(self.vectorstore.index, self.dense_index_meta, nprobe, ef_search)
+
+    # ---------------- metadata filters ----------------
+
+    def resolve_filters(self, filters):
+        """
+        (doc mask over the chunk store, FAISS selector) for a filter dict, or
+        (None, None) without filters. Kept for the FILTER_CACHE_SIZE most
+        recently used filters, so routed topics reuse their bitmaps.
+        """
+        key = normalize_filters(filters)
+        if key == (None, None):
+            return None, None
+
+        with self._filters_lock:
+            resolved = self._filters.get(key)
+            if resolved is None:
+                from dense_index import doc_mask_to_selector
+
+                doc_mask = self.bm25_chunks.filter_mask(*key)
+                resolved = (doc_mask, doc_mask_to_selector(self.vectorstore, doc_mask))
+
+                self._filters[key] = resolved
+                while len(self._filters) > FILTER_CACHE_SIZE:
+                    self._filters.popitem(last=False)
+            else:
+                self._filters.move_to_end(key)
+
+        return resolved
+
+    @property
+    def topic_classifier(self):
+        if self._topic_classifier is None:
+            self._topic_classifier = TopicClassifier(self.bm25, self.bm25_chunks)
+        return self._topic_classifier
+
+    def route(self, query: str):
+        """
+        {"topic": [...]} for queries the topic classifier is confident
+        about, else None (search everything).
+        """
+        topics = self.topic_classifier.route(self.bm25.analyzer(query))
+        return {"topic": topics} if topics else None
+
+    def retrieval_signals(self, query: str) -> dict:
+        """
+        Cheap corpus-match signals for a query, each roughly in [0, 1]:
+        bm25  - best BM25 score / the query's maximum attainable score
+        dense - cosine similarity of the nearest chunk (MiniLM vectors are
+                unit length, so cos = 1 - squared_L2 / 2)
+        """
+        # The analyzer sees the original case (chemical formulas, units)
+        tokens = self.bm25.analyzer(query)
+        query = query.lower()
+
+        _, bm25_scores = self.bm25.top_k(tokens, 1)
+        upper = self.bm25.score_upper_bound(tokens)
+        bm25 = float(bm25_scores[0]) / upper if len(bm25_scores) and upper > 0 else 0.0
+
+        nearest = self.vectorstore.similarity_search_with_score(query, k=1)
+        dense = 1.0 - float(nearest[0][1]) / 2 if nearest else 0.0
+
+        return {"bm25": bm25, "dense": dense}
+
+    def retrieve(self, query: str, mode: str = "hybrid", candidates: int = None, filters: dict = None) -> List[Document]:
+        """
+        mode: "hybrid" (fused), or "dense" / "bm25" alone (used by the benchmark).
+        candidates: over-fetch this many from each retriever and keep as many
+        fused results (input for a reranker) instead of k_dense/k_bm25/top_n.
+        filters: {"topic": ..., "source_file": glob...}; both retrievers skip
+        non-matching chunks before scoring (BM25 postings mask, FAISS IDSelector).
+        """
+        doc_mask, selector = self.resolve_filters(filters)
+
+        bm25_query = query      # original case, for the analyzer
         query=query.lower()
+        k_dense = candidates or self.k_dense
+        k_bm25 = candidates or self.k_bm25
 
         # Dense retrieval
-        dense_docs = self.dense_retriever.invoke(query)
+        if mode == "bm25":
+            dense_results = []
+        elif selector is not None:
+            from dense_index import search_with_selector
+
+            dense_results = [
+                (doc, -distance)
+                for doc, distance in search_with_selector(
+                    self.vectorstore, self.dense_index_meta, self.embeddings.embed_query(query), k_dense, selector
+                )
+            ]
+        else:
+            dense_results = retrieve_dense(query, self.vectorstore, k_dense)
 
         # BM25 retrieval
-        bm25_docs = retrieve_bm25(query, self.bm25, self.bm25_chunks)
-
-        # Merge & deduplicate
-        merged_docs = merge_results(dense_docs, bm25_docs)
-
-        return merged_docs
\ No newline at end of file
+        bm25_results = retrieve_bm25(bm25_query, self.bm25, self.bm25_chunks, k_bm25, doc_mask) if mode != "dense" else []
+
+        # Fuse, deduplicate by chunk ID, keep the best top_n
+        return fuse_results(
+            [dense_results, bm25_results],
+            [DENSE_WEIGHT, BM25_WEIGHT],
+            method=self.fusion_method,
+            top_n=candidates or self.top_n
+        )
@@ -1,18 +1,57 @@
-from typing import TypedDict, Optional, List, Literal
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict, Optional, List, Literal, Dict
 from langchain_core.documents import Document
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END
 
-from decide_retrieval_agent import decide_retrieval_func
-from Direct_generation_agent import direct_generation_func
-from hybrid_retrieval_agent import HybridRetrievalAgent
-from retrieval_checker_agent import relevance_checker
-from generate_from_context import generate_from_context
-from is_support_agent import issup_checker
-from rewrite_answer_agent import revise_answer
-from useful_answer_checker import is_useful
-from query_rewriter_agent import rewrite_question
+from decide_retrieval_agent import decide_retrieval_func, adecide_retrieval_func
+from Direct_generation_agent import direct_generation_func, adirect_generation_func
+from hybrid_retrieval_agent import chunk_key
+from reranker_agent import get_reranker
+from retrieval_checker_agent import relevance_checker_batch, arelevance_checker_batch
+from generate_from_context import stream_generate_from_context, astream_generate_from_context
+from is_support_agent import issup_checker, aissup_checker
+from rewrite_answer_agent import stream_revise_answer, astream_revise_answer
+from useful_answer_checker import is_useful, ais_useful
+from query_rewriter_agent import rewrite_question, arewrite_question
+from context_budget import assemble_context
+from resources import get_answer_cache, get_retriever
+from tracing import new_trace_id, traced
 
-retriever = HybridRetrievalAgent()
+# ==========================================================
+# CONFIG
+# ==========================================================
+
+# How decide_retrieval picks between retrieval and direct generation:
+#   "llm"         - ask the LLM, then retrieve (sequential)
+#   "speculative" - ask the LLM while retrieval already runs; keep or drop the docs
+#   "local"       - no LLM call: retrieve when BM25 / embedding match signals clear a threshold
+# "speculative" hides retrieval latency behind the decision call, but every query pays for a
+# retrieval (embedding + RERANK_CANDIDATES dense/BM25 over-fetch), even those answered directly;
+# opt in with VERITAS_RETRIEVAL_DECISION=speculative.
+RETRIEVAL_DECISION_MODE = os.environ.get("VERITAS_RETRIEVAL_DECISION", "llm")
+LOCAL_BM25_THRESHOLD = 0.25
+LOCAL_DENSE_THRESHOLD = 0.45
+
+# Cross-encoder stage between retrieve and is_relevant: over-fetch RERANK_CANDIDATES
+# fused docs, rerank them locally and grade only the top few with the LLM.
+RERANK_ENABLED = os.environ.get("VERITAS_RERANK", "1") != "0"
+RERANK_CANDIDATES = 50
+
+# Topic routing: when the caller sets no "filters", a cheap classifier over the
+# BM25 postings restricts retrieval to the query's likely topic(s), so most
+# queries scan only part of the corpus. Falls back to the whole corpus when
+# the classifier is unsure or the routed search finds nothing.
+TOPIC_ROUTING = True
+
+# Relevant docs accumulate across rewrite loops (graded once per request), up to this many
+MAX_RELEVANT_DOCS = 6
+
+# The retriever and answer cache are built on first use (or by resources.warm_up),
+# so importing this module does not load the embedding model or the stores.
+speculation_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative-retrieval")
 
 # ==========================================================
 # STATE
@@ -32,15 +71,88 @@ class AgentState(TypedDict):
     retries: Optional[int]
     isuse: Optional[Literal["useful","not-useful"]]
     use_reason: Optional[str]
+    draft_id: Optional[int]
+    prefetched_query: Optional[str]
+    relevance_memo: Optional[Dict[str, bool]]
+    filters: Optional[dict]
+
+# ==========================================================
+# TOKEN STREAMING
+# ==========================================================
+# Generation nodes push tokens through LangGraph's "custom" stream mode:
+#   {"event": "token", "node", "draft_id", "text"}
+#   {"event": "superseded", "draft_id", "by"}  - an earlier draft was replaced
+# With other stream modes (or plain invoke) the writer is a no-op.
+
+def supersede_draft(state: AgentState, node: str):
+    if state.get("draft_id"):
+        get_stream_writer()({"event": "superseded", "draft_id": state["draft_id"], "by": node})
+
+def stream_draft(state: AgentState, node: str, chunks):
+    supersede_draft(state, node)
+
+    writer = get_stream_writer()
+    draft_id = (state.get("draft_id") or 0) + 1
+    parts = []
+
+    for chunk in chunks:
+        parts.append(chunk)
+        writer({"event": "token", "node": node, "draft_id": draft_id, "text": chunk})
+
+    return "".join(parts), draft_id
+
+async def astream_draft(state: AgentState, node: str, chunks):
+    supersede_draft(state, node)
+
+    writer = get_stream_writer()
+    draft_id = (state.get("draft_id") or 0) + 1
+    parts = []
+
+    async for chunk in chunks:
+        parts.append(chunk)
+        writer({"event": "token", "node": node, "draft_id": draft_id, "text": chunk})
+
+    return "".join(parts), draft_id
 
 # ==========================================================
 # NODES
 # ==========================================================
 
+def retrieve_docs(query: str, filters: Optional[dict] = None) -> List[Document]:
+    retriever = get_retriever()
+    candidates = RERANK_CANDIDATES if RERANK_ENABLED else None
+
+    if filters:
+        return retriever.retrieve(query, candidates=candidates, filters=filters)
+
+    routed = retriever.route(query) if TOPIC_ROUTING else None
+    docs = retriever.retrieve(query, candidates=candidates, filters=routed) if routed else []
+    return docs or retriever.retrieve(query, candidates=candidates)
+
+def local_retrieval_decision(query: str) -> bool:
+    signals = get_retriever().retrieval_signals(query)
+    return signals["bm25"] >= LOCAL_BM25_THRESHOLD or signals["dense"] >= LOCAL_DENSE_THRESHOLD
+
 def decide_retrieval(state: AgentState):
     query = state.get("retrieval_query") or state["user_query"]
+
+    if RETRIEVAL_DECISION_MODE == "local":
+        return {"needs_retrieval": local_retrieval_decision(query)}
+
+    if RETRIEVAL_DECISION_MODE != "speculative":
+        decision = decide_retrieval_func(query)
+        return {"needs_retrieval": decision.should_retrieve}
+
+    # Retrieval is local and cheap next to the LLM round-trip: start it now and
+    # hand the docs to the retrieve node if the LLM agrees, else drop them.
+    prefetch = speculation_pool.submit(retrieve_docs, query, state.get("filters"))
     decision = decide_retrieval_func(query)
-    return {"needs_retrieval": decision.should_retrieve}
+
+    if not decision.should_retrieve:
+        prefetch.cancel()
+        return {"needs_retrieval": False}
+
+    return {"needs_retrieval": True, "docs": prefetch.result(), "prefetched_query": query}
 
 def direct_generation(state: AgentState):
     result = direct_generation_func(state["user_query"])
@@ -48,40 +160,83 @@ def direct_generation(state: AgentState):
 
 def retrieval(state: AgentState):
     query = state.get("retrieval_query") or state["user_query"]
-    merged_docs = retriever.retrieve(query)
-    return {"docs": merged_docs}
+
+    if state.get("prefetched_query") == query and state.get("docs") is not None:
+        return {"docs": state["docs"], "prefetched_query": None}
+
+    merged_docs = retrieve_docs(query, state.get("filters"))
+    return {"docs": merged_docs, "prefetched_query": None}
 
 def route_after_decide(state: AgentState):
     return "retrieve" if state["needs_retrieval"] else "generate_direct"
 
-def is_relevant(state: AgentState):
-    docs = state.get("docs") or []
-    query = state["user_query"]
+def rerank(state: AgentState):
+    docs = get_reranker().rerank(state["user_query"], state.get("docs") or [])
+    return {"docs": docs}
+
+def ungraded_docs(state: AgentState):
+    """
+    Docs of this retrieval not yet graded for this request's user_query
+    (relevance_memo maps chunk IDs to the verdicts of earlier loops).
+    """
+    memo = state.get("relevance_memo") or {}
+    return [doc for doc in state.get("docs") or [] if chunk_key(doc) not in memo]
+
+def accumulate_relevant(state: AgentState, graded_docs, decisions):
+    """
+    Records the new verdicts and puts this retrieval's relevant docs (in
+    retrieval order) ahead of those kept from earlier loops, deduplicated and
+    capped at MAX_RELEVANT_DOCS. Carried-over docs fed an answer that already
+    failed IsSUP / IsUSE, so they are the ones dropped at the cap; otherwise a
+    rewritten query could never change the context.
+    """
+    memo = dict(state.get("relevance_memo") or {})
+    for doc, keep in zip(graded_docs, decisions):
+        memo[chunk_key(doc)] = bool(keep)
+
+    retrieved = [doc for doc in state.get("docs") or [] if memo.get(chunk_key(doc))]
+    carried = state.get("relevant_docs") or []
 
     relevant_docs = []
-    for doc in docs:
-        if relevance_checker(doc.page_content, query):
+    seen = set()
+
+    for doc in retrieved + carried:
+        key = chunk_key(doc)
+        if key not in seen:
             relevant_docs.append(doc)
+            seen.add(key)
+
+    return {"relevant_docs": relevant_docs[:MAX_RELEVANT_DOCS], "relevance_memo": memo}
+
+def is_relevant(state: AgentState):
+    docs = ungraded_docs(state)
+    query = state["user_query"]
+
+    decisions = relevance_checker_batch([doc.page_content for doc in docs], query) if docs else []
 
-    return {"relevant_docs": relevant_docs}
+    return accumulate_relevant(state, docs, decisions)
 
 def route_after_relevance(state: AgentState):
     return "generate_from_context" if state.get("relevant_docs") else "no_relevant_docs"
 
+def build_context(relevant_docs):
+    # Same-page chunks merged (overlap written once), packed to CONTEXT_TOKEN_BUDGET
+    return assemble_context(relevant_docs)
+
 def generate_from_context_agent(state: AgentState):
     relevant_docs = state.get("relevant_docs") or []
     query = state["user_query"]
 
-    context = "\n\n".join(
-        f"{doc.page_content}\n(Source: {doc.metadata['source_file']}, Page: {doc.metadata['page_number']})"
-        for doc in relevant_docs
-    )
+    context = build_context(relevant_docs)
 
-    result = generate_from_context(query, context)
+    result, draft_id = stream_draft(
+        state, "generate_from_context", stream_generate_from_context(query, context)
+    )
 
-    return {"answer": result, "context": context, "retries": 0}
+    return {"answer": result, "context": context, "retries": 0, "draft_id": draft_id}
 
 def no_relevant_docs(state: AgentState):
+    supersede_draft(state, "no_relevant_docs")
     return {"answer": "No relevant documents found.", "context": ""}
 
 def is_sup(state: AgentState):
@@ -103,14 +258,19 @@ def route_after_issup(state: AgentState):
         return "rewrite_question"
 
 def revise_answer_node(state: AgentState):
-    result = revise_answer(
-        state["user_query"],
-        state.get("context") or "",
-        state.get("answer") or ""
+    result, draft_id = stream_draft(
+        state,
+        "revise_answer",
+        stream_revise_answer(
+            answer=state.get("answer") or "",
+            context=state.get("context") or "",
+            query=state["user_query"]
+        )
     )
     return {
-        "answer": result,
-        "retries": state.get("retries", 0) + 1
+        "answer": result.strip(),
+        "retries": state.get("retries", 0) + 1,
+        "draft_id": draft_id
     }
 
 def is_use(state: AgentState):
@@ -143,38 +303,222 @@ def rewrite_question_node(state: AgentState):
 def finalize(state: AgentState):
     return state
 
+# ==========================================================
+# ASYNC NODES
+# ==========================================================
+# Same logic as above, awaiting the agents' ainvoke paths. Retrieval is
+# local CPU work, so it runs in a worker thread to keep the loop free.
+
+async def adecide_retrieval(state: AgentState):
+    query = state.get("retrieval_query") or state["user_query"]
+
+    if RETRIEVAL_DECISION_MODE == "local":
+        return {"needs_retrieval": await asyncio.to_thread(local_retrieval_decision, query)}
+
+    if RETRIEVAL_DECISION_MODE != "speculative":
+        decision = await adecide_retrieval_func(query)
+        return {"needs_retrieval": decision.should_retrieve}
+
+    prefetch = asyncio.ensure_future(asyncio.to_thread(retrieve_docs, query, state.get("filters")))
+    try:
+        decision = await adecide_retrieval_func(query)
+    except BaseException:
+        prefetch.cancel()
+        raise
+
+    if not decision.should_retrieve:
+        prefetch.cancel()
+        return {"needs_retrieval": False}
+
+    return {"needs_retrieval": True, "docs": await prefetch, "prefetched_query": query}
+
+async def adirect_generation(state: AgentState):
+    result = await adirect_generation_func(state["user_query"])
+    return {"answer": result}
+
+async def aretrieval(state: AgentState):
+    query = state.get("retrieval_query") or state["user_query"]
+
+    if state.get("prefetched_query") == query and state.get("docs") is not None:
+        return {"docs": state["docs"], "prefetched_query": None}
+
+    merged_docs = await asyncio.to_thread(retrieve_docs, query, state.get("filters"))
+    return {"docs": merged_docs, "prefetched_query": None}
+
+async def arerank(state: AgentState):
+    docs = await asyncio.to_thread(get_reranker().rerank, state["user_query"], state.get("docs") or [])
+    return {"docs": docs}
+
+async def ais_relevant(state: AgentState):
+    docs = ungraded_docs(state)
+    query = state["user_query"]
+
+    decisions = await arelevance_checker_batch([doc.page_content for doc in docs], query) if docs else []
+
+    return accumulate_relevant(state, docs, decisions)
+
+async def agenerate_from_context_agent(state: AgentState):
+    relevant_docs = state.get("relevant_docs") or []
+    query = state["user_query"]
+
+    context = build_context(relevant_docs)
+
+    result, draft_id = await astream_draft(
+        state, "generate_from_context", astream_generate_from_context(query, context)
+    )
+
+    return {"answer": result, "context": context, "retries": 0, "draft_id": draft_id}
+
+async def ais_sup(state: AgentState):
+    decision = await aissup_checker(
+        state["user_query"],
+        state.get("context") or "",
+        state.get("answer") or ""
+    )
+    return {"issup": decision.issup, "evidence": decision.evidence}
+
+async def arevise_answer_node(state: AgentState):
+    result, draft_id = await astream_draft(
+        state,
+        "revise_answer",
+        astream_revise_answer(
+            answer=state.get("answer") or "",
+            context=state.get("context") or "",
+            query=state["user_query"]
+        )
+    )
+    return {
+        "answer": result.strip(),
+        "retries": state.get("retries", 0) + 1,
+        "draft_id": draft_id
+    }
+
+async def ais_use(state: AgentState):
+    decision = await ais_useful(
+        state["user_query"],
+        state.get("answer") or ""
+    )
+    return {"isuse": decision.isuse, "use_reason": decision.reason}
+
+async def arewrite_question_node(state: AgentState):
+    rewrite_tries = state.get("rewrite_tries", 0)
+
+    if rewrite_tries >= 2:
+        return {}
+
+    decision = await arewrite_question(
+        state["user_query"],
+        state.get("retrieval_query", ""),
+        state.get("answer", "")
+    )
+
+    return {
+        "retrieval_query": decision.retrieval_query,
+        "rewrite_tries": rewrite_tries + 1
+    }
+
 # ==========================================================
 # GRAPH BUILD
 # ==========================================================
 
-builder = StateGraph(AgentState)
-
-builder.add_node("decide_retrieval", decide_retrieval)
-builder.add_node("generate_direct", direct_generation)
-builder.add_node("retrieve", retrieval)
-builder.add_node("is_relevant", is_relevant)
-builder.add_node("generate_from_context", generate_from_context_agent)
-builder.add_node("no_relevant_docs", no_relevant_docs)
-builder.add_node("is_sup", is_sup)
-builder.add_node("revise_answer", revise_answer_node)
-builder.add_node("is_use", is_use)
-builder.add_node("rewrite_question", rewrite_question_node)
-builder.add_node("finalize", finalize)
-
-builder.set_entry_point("decide_retrieval")
-
-builder.add_conditional_edges("decide_retrieval", route_after_decide)
-builder.add_edge("retrieve", "is_relevant")
-builder.add_conditional_edges("is_relevant", route_after_relevance)
-builder.add_edge("generate_from_context", "is_sup")
-builder.add_conditional_edges("is_sup", route_after_issup)
-builder.add_edge("revise_answer", "is_sup")
-builder.add_conditional_edges("is_use", route_after_isuse)
-builder.add_edge("rewrite_question", "retrieve")
-
-builder.add_edge("generate_direct", END)
-builder.add_edge("no_relevant_docs", END)
-builder.add_edge("finalize", END)
-
-graph = builder.compile()
+SYNC_NODES = {
+    "decide_retrieval": decide_retrieval,
+    "generate_direct": direct_generation,
+    "retrieve": retrieval,
+    "rerank": rerank,
+    "is_relevant": is_relevant,
+    "generate_from_context": generate_from_context_agent,
+    "no_relevant_docs": no_relevant_docs,
+    "is_sup": is_sup,
+    "revise_answer": revise_answer_node,
+    "is_use": is_use,
+    "rewrite_question": rewrite_question_node,
+    "finalize": finalize,
+}
+
+ASYNC_NODES = {
+    **SYNC_NODES,
+    "decide_retrieval": adecide_retrieval,
+    "generate_direct": adirect_generation,
+    "retrieve": aretrieval,
+    "rerank": arerank,
+    "is_relevant": ais_relevant,
+    "generate_from_context": agenerate_from_context_agent,
+    "is_sup": ais_sup,
+    "revise_answer": arevise_answer_node,
+    "is_use": ais_use,
+    "rewrite_question": arewrite_question_node,
+}
+
+def build_graph(nodes):
+    builder = StateGraph(AgentState)
+
+    if not RERANK_ENABLED:
+        nodes = {name: fn for name, fn in nodes.items() if name != "rerank"}
+
+    for name, fn in nodes.items():
+        builder.add_node(name, traced(name, fn))
+
+    builder.set_entry_point("decide_retrieval")
+
+    builder.add_conditional_edges("decide_retrieval", route_after_decide)
+    if RERANK_ENABLED:
+        builder.add_edge("retrieve", "rerank")
+        builder.add_edge("rerank", "is_relevant")
+    else:
+        builder.add_edge("retrieve", "is_relevant")
+    builder.add_conditional_edges("is_relevant", route_after_relevance)
+    builder.add_edge("generate_from_context", "is_sup")
+    builder.add_conditional_edges("is_sup", route_after_issup)
+    builder.add_edge("revise_answer", "is_sup")
+    builder.add_conditional_edges("is_use", route_after_isuse)
+    builder.add_edge("rewrite_question", "retrieve")
+
+    builder.add_edge("generate_direct", END)
+    builder.add_edge("no_relevant_docs", END)
+    builder.add_edge("finalize", END)
+
+    return builder.compile()
 
+graph = build_graph(SYNC_NODES)
+async_graph = build_graph(ASYNC_NODES)
+
+# ==========================================================
+# CACHED ENTRY POINT
+# ==========================================================
+
+def invoke_with_cache(user_query: str, trace_id: str = None, filters: dict = None):
+    """
+    Runs the graph unless an equivalent question was already answered
+    (fully supported + useful). Cache hits carry a "cache_hit" key.
+    Filtered questions bypass the answer cache, which is keyed by query only.
+    """
+    answer_cache = get_answer_cache()
+    cached = answer_cache.lookup(user_query) if not filters else None
+    if cached is not None:
+        return cached
+
+    final_state = graph.invoke(
+        {"user_query": user_query, "retries": 0, "rewrite_tries": 0, "filters": filters},
+        config={"configurable": {"trace_id": trace_id or new_trace_id()}}
+    )
+    if not filters:
+        answer_cache.store(user_query, final_state)
+    return final_state
+
+async def ainvoke_with_cache(user_query: str, trace_id: str = None, filters: dict = None):
+    """
+    Async counterpart of invoke_with_cache, running async_graph.
+    """
+    answer_cache = await asyncio.to_thread(get_answer_cache)
+    cached = await asyncio.to_thread(answer_cache.lookup, user_query) if not filters else None
+    if cached is not None:
+        return cached
+
+    final_state = await async_graph.ainvoke(
+        {"user_query": user_query, "retries": 0, "rewrite_tries": 0, "filters": filters},
+        config={"configurable": {"trace_id": trace_id or new_trace_id()}}
+    )
+    if not filters:
+        await asyncio.to_thread(answer_cache.store, user_query, final_state)
+    return final_state
@@ -1,26 +1,59 @@
+import argparse
+import hashlib
+import itertools
+import json
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 
+from bm25_index import build_bm25_store, iter_chunks, iter_store_chunks, store_is_current, write_chunk
+from dense_index import (
+    HNSW_M, INDEX_TYPES, NLIST, PQ_M,
+    build_ann_index, factory_string, index_size_mb, read_ann_meta, remove_ann_index, remove_dense_store,
+    write_ann_index, write_row_map
+)
+from embedding_cache import CachedEmbeddings
+
 
 # -------- CONFIG --------
 DATA_DIR = r"D:\AdvancedML\MultiAgent_HybridRAG_ChemicalEngineering\data"
-VECTOR_DB_DIR = r"D:\AdvancedML\MultiAgent_HybridRAG_ChemicalEngineering\embeddings\vectorstore"
+# Same override as hybrid_retrieval_agent.VECTOR_DB_DIR, so ingest writes where the retriever
+# and the answer cache's manifest check read
+VECTOR_DB_DIR = os.environ.get(
+    "VERITAS_VECTOR_DB_DIR",
+    r"D:\AdvancedML\MultiAgent_HybridRAG_ChemicalEngineering\embeddings\vectorstore"
+)
+BM25_STORE_DIR = os.path.join(VECTOR_DB_DIR, "bm25")
+MANIFEST_PATH = os.path.join(VECTOR_DB_DIR, "manifest.json")
+MANIFEST_VERSION = 1
+SPOOL_PATH = os.path.join(VECTOR_DB_DIR, "new_chunks.jsonl.tmp")
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_CACHE_DIR = os.path.join(os.path.dirname(VECTOR_DB_DIR), "embedding_cache")
 
 CHUNK_SIZE = 800
 CHUNK_OVERLAP = 100
+
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+EMBED_BATCH_SIZE = 256
+PROGRESS_INTERVAL_S = 5.0
+
+# Dense index served by the retriever: "flat" (exact), "ivf_flat", "ivf_pq", "hnsw" or "sq8".
+# The flat store is always kept for incremental updates; see dense_index.py.
+INDEX_TYPE = "flat"
 # ------------------------
 
 
-def load_documents():
+def scan_pdfs():
     """
-    Loads PDF documents from topic-wise folders.
-    Adds metadata: topic, source file, page number.
+    Finds every PDF under the topic-wise folders.
+    Returns {relative path: (topic, file name, absolute path)}.
     """
-    documents = []
+    pdfs = {}
 
     for topic in os.listdir(DATA_DIR):
         topic_path = os.path.join(DATA_DIR, topic)
@@ -30,24 +63,47 @@ def load_documents():
 
         for file in os.listdir(topic_path):
             if file.endswith(".pdf"):
-                pdf_path = os.path.join(topic_path, file)
-                loader = PyPDFLoader(pdf_path)
-                pages = loader.load()
+                pdfs[f"{topic}/{file}"] = (topic, file, os.path.join(topic_path, file))
+
+    return pdfs
+
+
+def load_pdf(topic, file, pdf_path):
+    """
+    Loads one PDF.
+    Adds metadata: topic, source file, page number.
+    """
+    pages = PyPDFLoader(pdf_path).load()
+
+    for page in pages:
+        page.metadata["topic"] = topic
+        page.metadata["source_file"] = file
+        page.metadata["page_number"] = page.metadata.get("page", None)
 
-                for page in pages:
-                    page.metadata["topic"] = topic
-                    page.metadata["source_file"] = file
-                    page.metadata["page_number"] = page.metadata.get("page", None)
+    return pages
 
-                documents.extend(pages)
 
-    return documents
+def make_chunk_id(chunk, seen):
+    """
+    Content-derived chunk ID: stable across re-runs as long as the chunk's
+    file, page and text are unchanged. `seen` disambiguates repeated text.
+    """
+    key = "|".join([
+        str(chunk.metadata.get("topic")),
+        str(chunk.metadata.get("source_file")),
+        str(chunk.metadata.get("page_number")),
+        chunk.page_content,
+    ])
+    chunk_id = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    seen[chunk_id] = seen.get(chunk_id, -1) + 1
+    return chunk_id if seen[chunk_id] == 0 else f"{chunk_id}-{seen[chunk_id]}"
 
 
 def chunk_documents(documents):
     """
     Splits documents into overlapping chunks.
-    Adds unique chunk_id to each chunk.
+    Adds a stable, content-derived chunk_id to each chunk.
     """
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
@@ -56,36 +112,370 @@ def chunk_documents(documents):
 
     chunks = splitter.split_documents(documents)
 
-    for i, chunk in enumerate(chunks):
-        chunk.metadata["chunk_id"] = i
+    seen = {}
+    for chunk in chunks:
+        chunk.metadata["chunk_id"] = make_chunk_id(chunk, seen)
 
     return chunks
 
 
-def create_vectorstore(chunks):
+def load_embeddings():
     """
-    Creates FAISS vector store from chunks and saves locally.
+    MiniLM behind the shared embedding cache: unchanged chunk texts
+    (re-ingested files, --full rebuilds) are not re-embedded.
     """
-    os.makedirs(VECTOR_DB_DIR, exist_ok=True)
+    return CachedEmbeddings(
+        HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL),
+        EMBEDDING_MODEL,
+        EMBEDDING_CACHE_DIR
+    ).open_store()
+
 
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
+def load_vectorstore(embeddings, stale_ids):
+    """
+    Loads the saved FAISS store and deletes the vectors of removed/changed files.
+    """
+    vectorstore = FAISS.load_local(
+        VECTOR_DB_DIR,
+        embeddings,
+        allow_dangerous_deserialization=True
     )
 
-    vectorstore = FAISS.from_documents(chunks, embeddings)
-    vectorstore.save_local(VECTOR_DB_DIR)
+    existing = set(vectorstore.index_to_docstore_id.values())
+    stale_ids = [chunk_id for chunk_id in stale_ids if chunk_id in existing]
+    if stale_ids:
+        vectorstore.delete(stale_ids)
 
+    return vectorstore
+
+
+# ==========================================================
+# ---------------- STREAMING PIPELINE ----------------------
+# ==========================================================
+
+def parse_pdf(job):
+    """
+    Process-pool worker: (rel_path, topic, file, path) -> (rel_path, pages).
+    """
+    rel_path, topic, file, pdf_path = job
+    return rel_path, load_pdf(topic, file, pdf_path)
+
+
+def iter_parsed_pdfs(pdfs, workers):
+    """
+    Yields (rel_path, pages) as PDFs finish parsing. At most 2 * workers PDFs
+    are in flight, so parsed pages never pile up ahead of the embedder.
+    """
+    jobs = iter([(rel_path, *info) for rel_path, info in pdfs.items()])
+
+    if workers <= 1:
+        for job in jobs:
+            yield parse_pdf(job)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+
+        while True:
+            for job in itertools.islice(jobs, 2 * workers - len(pending)):
+                pending.add(pool.submit(parse_pdf, job))
+
+            if not pending:
+                return
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def stream_chunks(parsed_pdfs, progress):
+    for _, pages in parsed_pdfs:
+        progress.add(pdfs=1, pages=len(pages))
+        yield from chunk_documents(pages)
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_batch(vectorstore, embeddings, chunks):
+    """
+    Embeds one batch and adds it to the index (creating the index on the first batch).
+    The FAISS docstore only keeps each row's chunk ID (for incremental deletes);
+    texts and metadata are stored once, in the BM25 chunk store.
+    """
+    texts = [chunk.page_content for chunk in chunks]
+    text_embeddings = list(zip([""] * len(texts), embeddings.embed_documents(texts)))
+    ids = [chunk.metadata["chunk_id"] for chunk in chunks]
+    metadatas = [{"chunk_id": chunk_id} for chunk_id in ids]
+
+    if vectorstore is None:
+        return FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
+
+    vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+    return vectorstore
+
+
+class Progress:
+
+    def __init__(self, total_pdfs, interval=PROGRESS_INTERVAL_S):
+        self.total_pdfs = total_pdfs
+        self.interval = interval
+        self.pdfs = self.pages = self.chunks = 0
+        self.start = self.last_report = time.perf_counter()
+
+    def add(self, pdfs=0, pages=0, chunks=0):
+        self.pdfs += pdfs
+        self.pages += pages
+        self.chunks += chunks
+
+        if time.perf_counter() - self.last_report >= self.interval:
+            self.report()
+
+    def report(self, final=False):
+        now = time.perf_counter()
+        elapsed = max(now - self.start, 1e-9)
+        self.last_report = now
+
+        print(
+            f"{'✅' if final else '⏳'} {self.pdfs}/{self.total_pdfs} PDFs | "
+            f"{self.pages} pages ({self.pages / elapsed:.1f}/s) | "
+            f"{self.chunks} chunks embedded ({self.chunks / elapsed:.1f}/s) | "
+            f"{elapsed:.1f}s"
+        )
+
+
+# ==========================================================
+# ---------------- MANIFEST --------------------------------
+# ==========================================================
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-if __name__ == "__main__":
-    print("📄 Loading documents...")
-    docs = load_documents()
-    print(f"✅ Loaded {len(docs)} pages")
 
-    print("✂️ Chunking documents...")
-    chunks = chunk_documents(docs)
-    print(f"✅ Created {len(chunks)} chunks")
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return None
 
-    print("🧠 Creating vector store...")
-    create_vectorstore(chunks)
+    with open(MANIFEST_PATH, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def save_manifest(files):
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "files": files}, f, indent=2)
+
+
+def diff_manifest(pdfs, files):
+    """
+    Compares the PDFs on disk against the manifest.
+    mtime/size are checked first; the content hash only when they differ,
+    so touching a file without editing it does not trigger a re-embed.
+    Returns (changed pdfs, removed relative paths, refreshed manifest entries).
+    """
+    changed = {}
+    entries = {}
+
+    for rel_path, (topic, file, pdf_path) in pdfs.items():
+        stat = os.stat(pdf_path)
+        entry = files.get(rel_path)
+
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            entries[rel_path] = entry
+            continue
+
+        sha256 = file_sha256(pdf_path)
+        if entry and entry["sha256"] == sha256:
+            entries[rel_path] = dict(entry, mtime=stat.st_mtime, size=stat.st_size)
+            continue
+
+        changed[rel_path] = (topic, file, pdf_path)
+        entries[rel_path] = {"sha256": sha256, "mtime": stat.st_mtime, "size": stat.st_size, "chunk_ids": []}
+
+    removed = [rel_path for rel_path in files if rel_path not in pdfs]
+    return changed, removed, entries
+
+
+def dense_index_is_current(index_type, nlist, pq_m, hnsw_m):
+    meta = read_ann_meta(VECTOR_DB_DIR)
+
+    if index_type == "flat":
+        return meta is None
+    if meta is None or meta["index_type"] != index_type:
+        return False
+
+    factory, _ = factory_string(index_type, meta["dim"], meta["ntotal"], nlist, pq_m, hnsw_m)
+    return factory == meta["factory"]
+
+
+def update_dense_index(vectorstore, index_type, nlist, pq_m, hnsw_m):
+    """
+    Rebuilds ann.faiss from the flat store's vectors (or removes it for "flat").
+    Runs after the flat store and row map were rewritten, so when no index
+    can be trained (empty store, too few vectors for PQ) the old ann.faiss is
+    removed rather than left out of step with them; the retriever then
+    serves the flat index.
+    """
+    if index_type == "flat":
+        remove_ann_index(VECTOR_DB_DIR)
+        return
+
+    ntotal = vectorstore.index.ntotal
+    if ntotal == 0:
+        remove_ann_index(VECTOR_DB_DIR)
+        print(f"⚠️ Dense store is empty; no {index_type} index built.")
+        return
+
+    try:
+        factory_string(index_type, vectorstore.index.d, ntotal, nlist, pq_m, hnsw_m)
+    except ValueError as e:
+        remove_ann_index(VECTOR_DB_DIR)
+        print(f"⚠️ {e}; serving the flat index.")
+        return
+
+    print(f"🗂️ Building {index_type} index over {ntotal} vectors...")
+    index, meta = build_ann_index(vectorstore.index, index_type, nlist, pq_m, hnsw_m)
+    write_ann_index(index, meta, VECTOR_DB_DIR)
+    print(f"   {meta['factory']}: {index_size_mb(index):.1f} MB, "
+          f"trained on {meta['train_points']} vectors, built in {meta['build_seconds']}s")
+
+
+def ingest(
+    full=False,
+    workers=DEFAULT_WORKERS,
+    batch_size=EMBED_BATCH_SIZE,
+    index_type=INDEX_TYPE,
+    nlist=NLIST,
+    pq_m=PQ_M,
+    hnsw_m=HNSW_M
+):
+    """
+    Parse (process pool) -> chunk (generator) -> embed (fixed-size batches)
+    -> add to FAISS, one batch at a time. New chunks are spooled to disk for
+    the BM25 build instead of being held in memory.
+    """
+    pdfs = scan_pdfs()
+    manifest = None if full else load_manifest()
+    # A BM25 store from an older layout version forces a full rebuild
+    # (cheap with the embedding cache: unchanged chunks are not re-embedded).
+    incremental = manifest is not None and store_is_current(BM25_STORE_DIR)
+
+    if incremental:
+        changed, removed, entries = diff_manifest(pdfs, manifest["files"])
+        print(f"📄 {len(changed)} added/changed, {len(removed)} deleted, "
+              f"{len(pdfs) - len(changed)} unchanged PDFs")
+
+        if not changed and not removed:
+            if not dense_index_is_current(index_type, nlist, pq_m, hnsw_m):
+                update_dense_index(load_vectorstore(load_embeddings(), set()), index_type, nlist, pq_m, hnsw_m)
+            save_manifest(entries)
+            print("✅ Nothing to re-embed.")
+            return
+    else:
+        print(f"📄 Full build over {len(pdfs)} PDFs...")
+        changed, removed, entries = diff_manifest(pdfs, {})
+
+    stale_ids = set()
+    if incremental:
+        for rel_path in list(changed) + removed:
+            stale_ids.update(manifest["files"].get(rel_path, {}).get("chunk_ids", []))
+
+    os.makedirs(VECTOR_DB_DIR, exist_ok=True)
+    embeddings = load_embeddings()
+    vectorstore = load_vectorstore(embeddings, stale_ids) if incremental else None
+    existing_ids = set(vectorstore.index_to_docstore_id.values()) if vectorstore else set()
+
+    print(f"🧠 Parsing with {workers} workers, embedding in batches of {batch_size}...")
+    progress = Progress(len(changed))
+    new_ids = set()
+
+    with open(SPOOL_PATH, "w", encoding="utf-8") as spool:
+        chunks = stream_chunks(iter_parsed_pdfs(changed, workers), progress)
+
+        for batch in batched(chunks, batch_size):
+            batch_ids = [chunk.metadata["chunk_id"] for chunk in batch]
+
+            # Left over from a run that died before saving the manifest.
+            leftovers = [chunk_id for chunk_id in batch_ids if chunk_id in existing_ids]
+            if leftovers:
+                vectorstore.delete(leftovers)
+
+            vectorstore = embed_batch(vectorstore, embeddings, batch)
+
+            for chunk in batch:
+                write_chunk(spool, chunk)
+                rel_path = f"{chunk.metadata['topic']}/{chunk.metadata['source_file']}"
+                entries[rel_path]["chunk_ids"].append(chunk.metadata["chunk_id"])
+
+            new_ids.update(batch_ids)
+            progress.add(chunks=len(batch))
+
+    progress.report(final=True)
+
+    cache_stats = embeddings.stats()
+    print(f"🧮 Embedding cache: {cache_stats['hit_ratio']:.1%} hits "
+          f"({cache_stats['memory_hits'] + cache_stats['disk_hits']} reused, {cache_stats['misses']} embedded)")
+
+    if vectorstore is None:
+        # The BM25 / chunk store below is rebuilt empty; an old dense store
+        # left next to it would resolve hits to chunks that no longer exist.
+        remove_dense_store(VECTOR_DB_DIR)
+        print("⚠️ No chunks produced; dense store removed.")
+    else:
+        vectorstore.save_local(VECTOR_DB_DIR)
+
+    print("📚 Building BM25 store...")
+    kept_chunks = ()
+    if incremental:
+        replaced_ids = stale_ids | new_ids
+        kept_chunks = (
+            chunk for chunk in iter_store_chunks(BM25_STORE_DIR)
+            if chunk.metadata.get("chunk_id") not in replaced_ids
+        )
+    chunk_ids = build_bm25_store(itertools.chain(kept_chunks, iter_chunks(SPOOL_PATH)), BM25_STORE_DIR)
+    os.remove(SPOOL_PATH)
+
+    if vectorstore is not None:
+        write_row_map(vectorstore, chunk_ids, VECTOR_DB_DIR)
+        update_dense_index(vectorstore, index_type, nlist, pq_m, hnsw_m)
+
+    # Written last: an interrupted run leaves the old manifest in place,
+    # so the next run redoes the same files.
+    save_manifest(entries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest PDFs into the FAISS + BM25 stores")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and rebuild everything")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="PDF parsing processes (1 = in-process)")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Chunks embedded per batch")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE, help="Dense index served by the retriever")
+    parser.add_argument("--nlist", type=int, default=NLIST, help="IVF cells (default: 4 * sqrt(n))")
+    parser.add_argument("--pq-m", type=int, default=PQ_M, help="IVF-PQ sub-quantizers; must divide 384")
+    parser.add_argument("--hnsw-m", type=int, default=HNSW_M, help="HNSW graph degree")
+    args = parser.parse_args()
+
+    ingest(
+        full=args.full,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        index_type=args.index_type,
+        nlist=args.nlist,
+        pq_m=args.pq_m,
+        hnsw_m=args.hnsw_m
+    )
 
-    print("🚀 Ingestion complete. Vector store saved locally.")
+    print("🚀 Ingestion complete. Vector store and BM25 store saved locally.")
@@ -2,10 +2,8 @@ from typing import Literal, List
 from pydantic import BaseModel, Field
 from langchain_core.prompts import PromptTemplate
 
-from query_analyzer_agent import load_llm
-
-# Initialize once (good practice)
-llm = load_llm()
+from chain_registry import get_chain
+from verdict_cache import acached_verdict, cached_verdict
 
 
 # ============================== SCHEMA ==============================
@@ -15,19 +13,9 @@ class IsSUPDecision(BaseModel):
     evidence: List[str] = Field(default_factory=list)
 
 
-# ============================== ISSUP CHECKER ==============================
-
-def issup_checker(query: str, context: str, answer: str) -> IsSUPDecision:
-    # 🔒 Guard: if no context, automatically no_support
-    if not context:
-        return IsSUPDecision(
-            issup="no_support",
-            evidence=[]
-        )
-
-    issup_llm = llm.with_structured_output(IsSUPDecision)
+# ============================== PROMPT ==============================
 
-    issup_prompt = PromptTemplate.from_template("""
+issup_prompt = PromptTemplate.from_template("""
 You are a STRICT verification agent inside a grounded multi-agent RAG system.
 
 Your task is to determine whether the ANSWER is supported by the provided CONTEXT.
@@ -91,12 +79,45 @@ CONTEXT:
 {context}
 """)
 
-    chain = issup_prompt | issup_llm
 
-    result = chain.invoke({
+# ============================== ISSUP CHECKER ==============================
+
+def issup_checker(query: str, context: str, answer: str) -> IsSUPDecision:
+    # 🔒 Guard: if no context, automatically no_support
+    if not context:
+        return IsSUPDecision(
+            issup="no_support",
+            evidence=[]
+        )
+
+    chain = get_chain("issup", build_issup_chain)
+
+    result = cached_verdict("issup", issup_prompt, IsSUPDecision, {
         "query": query,
         "answer": answer,
         "context": context
-    })
+    }, chain.invoke)
+
+    return result
+
 
-    return result
\ No newline at end of file
+def build_issup_chain(llm):
+    issup_llm = llm.with_structured_output(IsSUPDecision)
+
+    return issup_prompt | issup_llm
+
+
+async def aissup_checker(query: str, context: str, answer: str) -> IsSUPDecision:
+    if not context:
+        return IsSUPDecision(
+            issup="no_support",
+            evidence=[]
+        )
+
+    chain = get_chain("issup", build_issup_chain)
+
+    return await acached_verdict("issup", issup_prompt, IsSUPDecision, {
+        "query": query,
+        "answer": answer,
+        "context": context
+    }, chain.ainvoke)
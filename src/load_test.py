@@ -0,0 +1,256 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+# ==========================================================
+# ---------------------- CONFIG ----------------------------
+# ==========================================================
+#
+# End-to-end load test of the full graph (decide -> retrieve -> rerank ->
+# grade -> generate -> IsSUP -> IsUSE -> rewrite) on a synthetic corpus,
+# with the stub LLM backend and hashing embeddings, so it runs offline and
+# measures the orchestration itself rather than the model server.
+
+NUM_QUERIES = 200
+CONCURRENCY = 8
+NUM_DOCS = 5000
+
+
+# ==========================================================
+# ---------------- ENVIRONMENT -----------------------------
+# ==========================================================
+
+def configure_environment(store_dir, args):
+    """
+    Must run before improved_rag_system (and the modules it imports) is
+    imported: backend, store location and rerank switch are read at import.
+    """
+    os.environ["VERITAS_LLM_BACKEND"] = "stub"
+    os.environ["VERITAS_EMBEDDINGS"] = "hashing"
+    os.environ["VERITAS_VECTOR_DB_DIR"] = store_dir
+    os.environ["VERITAS_RERANK"] = "1" if args.rerank else "0"
+
+    os.environ["VERITAS_STUB_LATENCY_S"] = str(args.llm_latency)
+    os.environ["VERITAS_STUB_TOKEN_LATENCY_S"] = str(args.token_latency)
+    os.environ["VERITAS_STUB_COMPLETION_TOKENS"] = str(args.completion_tokens)
+    os.environ["VERITAS_STUB_POSITIVE_RATE"] = str(args.positive_rate)
+    os.environ["VERITAS_STUB_MAX_PARALLEL"] = str(args.llm_parallel)
+
+
+def isolate_caches(tmp_dir, args):
+    """
+    Fresh in-memory tracer (no JSONL sink) large enough to keep every trace,
+    and a throwaway verdict cache unless --verdict-cache is given.
+    """
+    import tracing
+    from verdict_cache import verdict_cache
+
+    tracing.tracer = tracing.Tracer(sink_path=None, window=args.num_queries * 10, max_traces=args.num_queries)
+    verdict_cache.path = os.path.join(tmp_dir, "verdicts.sqlite3") if args.verdict_cache else None
+
+    return tracing.tracer
+
+
+# ==========================================================
+# ---------------- DRIVERS ---------------------------------
+# ==========================================================
+
+def initial_state(query):
+    return {"user_query": query, "retries": 0, "rewrite_tries": 0}
+
+
+def run_threaded(queries, concurrency, use_cache):
+    """
+    Sync graph from a thread pool, like concurrent Streamlit sessions.
+    Returns [(trace_id, latency_s, error)].
+    """
+    from improved_rag_system import graph, invoke_with_cache
+
+    def run_one(query):
+        trace_id = uuid.uuid4().hex
+        start = time.perf_counter()
+        try:
+            if use_cache:
+                invoke_with_cache(query, trace_id)
+            else:
+                graph.invoke(initial_state(query), config={"configurable": {"trace_id": trace_id}})
+            error = None
+        except Exception as e:
+            error = repr(e)
+        return trace_id, time.perf_counter() - start, error
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(run_one, queries))
+
+
+async def run_async(queries, concurrency, use_cache):
+    """
+    async_graph on one event loop, at most `concurrency` requests in flight,
+    like the server.
+    """
+    from improved_rag_system import ainvoke_with_cache, async_graph
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(query):
+        async with semaphore:
+            trace_id = uuid.uuid4().hex
+            start = time.perf_counter()
+            try:
+                if use_cache:
+                    await ainvoke_with_cache(query, trace_id)
+                else:
+                    await async_graph.ainvoke(initial_state(query), config={"configurable": {"trace_id": trace_id}})
+                error = None
+            except Exception as e:
+                error = repr(e)
+            return trace_id, time.perf_counter() - start, error
+
+    return await asyncio.gather(*(run_one(query) for query in queries))
+
+
+# ==========================================================
+# ---------------- REPORT ----------------------------------
+# ==========================================================
+
+def percentiles_ms(values):
+    values = np.asarray(values) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+
+def build_report(results, wall_s, tracer, args):
+    latencies = [latency for _, latency, _ in results]
+    errors = [error for _, _, error in results if error]
+
+    per_query = []
+    for trace_id, _, _ in results:
+        spans = tracer.spans_for(trace_id)
+        per_query.append({
+            "llm_calls": sum(span["llm_calls"] for span in spans),
+            "tokens": sum(span["prompt_tokens"] + span["completion_tokens"] for span in spans),
+            "nodes": len(spans),
+        })
+
+    llm_calls = [q["llm_calls"] for q in per_query]
+
+    return {
+        "driver": "async" if args.use_async else "threads",
+        "queries": len(results),
+        "concurrency": args.concurrency,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "wall_s": wall_s,
+        "qps": len(results) / wall_s if wall_s > 0 else float("nan"),
+        "latency": percentiles_ms(latencies),
+        "llm_calls_per_query": {
+            "mean": float(np.mean(llm_calls)),
+            "p50": float(np.percentile(llm_calls, 50)),
+            "max": int(max(llm_calls)),
+        },
+        "tokens_per_query": float(np.mean([q["tokens"] for q in per_query])),
+        "nodes_per_query": float(np.mean([q["nodes"] for q in per_query])),
+        "per_node": tracer.summary(),
+    }
+
+
+def print_report(report):
+    latency = report["latency"]
+    calls = report["llm_calls_per_query"]
+
+    print(f"\n📊 {report['queries']} queries, {report['driver']} x{report['concurrency']}, "
+          f"{report['errors']} errors, {report['wall_s']:.1f}s")
+    print(f"  QPS          : {report['qps']:.2f}")
+    print(f"  Latency      : p50 {latency['p50_ms']:.0f} ms | p95 {latency['p95_ms']:.0f} ms | p99 {latency['p99_ms']:.0f} ms")
+    print(f"  LLM calls/q  : mean {calls['mean']:.2f} | p50 {calls['p50']:.0f} | max {calls['max']}")
+    print(f"  Tokens/q     : {report['tokens_per_query']:.0f}")
+    print(f"  Nodes/q      : {report['nodes_per_query']:.1f}")
+
+    if report["first_error"]:
+        print(f"  ❌ First error: {report['first_error']}")
+
+    header = f"{'node':<24}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'llm/exec':>10}{'tok/exec':>10}"
+    print("\n" + header)
+    print("-" * len(header))
+    for node, stats in sorted(report["per_node"].items(), key=lambda item: -item[1]["p95_ms"]):
+        tokens = stats["prompt_tokens"] + stats["completion_tokens"]
+        print(f"{node:<24}{stats['count']:>7}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+              f"{stats['p99_ms']:>10.1f}{stats['llm_calls']:>10.2f}{tokens:>10.0f}")
+
+
+# ==========================================================
+# ---------------- CLI -------------------------------------
+# ==========================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test of the RAG graph with a stub LLM")
+    parser.add_argument("--num-queries", type=int, default=NUM_QUERIES)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--num-docs", type=int, default=NUM_DOCS, help="Synthetic corpus size")
+    parser.add_argument("--queries", help="JSONL query set instead of generated queries")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Drive async_graph instead of graph")
+    parser.add_argument("--cache", action="store_true", help="Go through the answer cache (invoke_with_cache)")
+    parser.add_argument("--verdict-cache", action="store_true", help="Keep the grader verdict cache on (fresh, temporary)")
+    parser.add_argument("--rerank", action="store_true", help="Enable the cross-encoder node (downloads the model)")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Stub time to first token, seconds")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Stub seconds per output token")
+    parser.add_argument("--completion-tokens", type=int, default=120, help="Stub free-text answer length")
+    parser.add_argument("--positive-rate", type=float, default=0.8, help="Stub P(retrieve / relevant / supported / useful)")
+    parser.add_argument("--llm-parallel", type=int, default=4, help="Stub concurrent generations (0 = unlimited)")
+    parser.add_argument("--json", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store_dir = os.path.join(tmp_dir, "vectorstore")
+        configure_environment(store_dir, args)
+
+        from benchmark_retrieval import build_synthetic_stores
+        from synthetic_corpus import HashingEmbeddings, generate_queries, read_queries
+
+        print(f"Generating and indexing {args.num_docs} synthetic chunks...")
+        chunks = build_synthetic_stores(store_dir, args.num_docs, HashingEmbeddings())
+        queries = read_queries(args.queries) if args.queries else generate_queries(chunks, args.num_queries)
+        queries = [q["query"] for q in queries][:args.num_queries]
+
+        tracer = isolate_caches(tmp_dir, args)
+
+        print("Loading graph...")
+        from resources import warm_up
+        warm_up(rerank=args.rerank)
+
+        print(f"🚀 Running {len(queries)} queries...")
+        start = time.perf_counter()
+        if args.use_async:
+            results = asyncio.run(run_async(queries, args.concurrency, args.cache))
+        else:
+            results = run_threaded(queries, args.concurrency, args.cache)
+        wall_s = time.perf_counter() - start
+
+        report = build_report(results, wall_s, tracer, args)
+
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    # Failed queries end early and would otherwise flatter QPS and latency
+    if report["errors"]:
+        print(f"\n❌ FAILED: {report['errors']} of {report['queries']} queries raised; the numbers above are not valid.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,7 @@
 from pydantic import BaseModel, Field
 from langchain_core.prompts import PromptTemplate
 from typing import Literal
-from query_analyzer_agent import load_llm
-
-llm = load_llm()
+from chain_registry import get_chain
 
 # ============================= SCHEMA =============================
 
@@ -33,7 +31,7 @@ RULES:
 EXAMPLE:
 Q: Derive operating line equation in distillation.
 Output:
-{"retrieval_query": "Operating line equation distillation McCabe Thiele mass balance"}
+{{"retrieval_query": "Operating line equation distillation McCabe Thiele mass balance"}}
 
 QUESTION:
 {question}
@@ -47,14 +45,16 @@ Answer (if any):
 
 # ============================= FUNCTION =============================
 
+def build_rewrite_chain(llm):
+    return rewrite_prompt | llm.with_structured_output(RewriteDecision)
+
+
 def rewrite_question(question: str, retrieval_question: str, answer: str) -> RewriteDecision:
 
     if not question:
         return RewriteDecision(retrieval_query="")
 
-    rewrite_llm = llm.with_structured_output(RewriteDecision)
-
-    chain = rewrite_prompt | rewrite_llm
+    chain = get_chain("rewrite_question", build_rewrite_chain)
 
     decision = chain.invoke({
         "question": question,
@@ -62,4 +62,18 @@ def rewrite_question(question: str, retrieval_question: str, answer: str) -> Rew
         "answer": answer
     })
 
-    return decision
\ No newline at end of file
+    return decision
+
+
+async def arewrite_question(question: str, retrieval_question: str, answer: str) -> RewriteDecision:
+
+    if not question:
+        return RewriteDecision(retrieval_query="")
+
+    chain = get_chain("rewrite_question", build_rewrite_chain)
+
+    return await chain.ainvoke({
+        "question": question,
+        "retrieval_query": retrieval_question,
+        "answer": answer
+    })
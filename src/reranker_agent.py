@@ -0,0 +1,114 @@
+import inspect
+import math
+import threading
+
+from langchain_core.documents import Document
+
+
+# ==========================================================
+# ---------------------- CONFIG ----------------------------
+# ==========================================================
+
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_BATCH_SIZE = 32
+RERANK_TOP_N = 4          # docs passed on to the LLM relevance grader
+RERANK_MIN_SCORE = 0.1    # cutoff on the sigmoid of the logit (0..1); None disables it
+RERANK_MIN_KEEP = 1       # the best candidate is always kept, so the grader still decides
+
+
+# ==========================================================
+# ---------------- CROSS-ENCODER RERANKER ------------------
+# ==========================================================
+
+def sigmoid(x):
+    if x >= 0:
+        return 1.0 / (1.0 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1.0 + z)
+
+
+def identity_activation(model):
+    """
+    predict() kwargs that return raw logits: the keyword is activation_fn
+    in sentence-transformers >= 4 and activation_fct before.
+    """
+    import torch
+
+    params = inspect.signature(model.predict).parameters
+    name = "activation_fn" if "activation_fn" in params else "activation_fct"
+    return {name: torch.nn.Identity()}
+
+
+class Reranker:
+    """
+    Scores (query, chunk) pairs with a small local cross-encoder, in batches
+    on CPU. The model is loaded on first use.
+    """
+
+    def __init__(self, model_name=RERANK_MODEL, batch_size=RERANK_BATCH_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def score(self, query, docs):
+        """
+        Relevance probabilities in [0, 1]. The model is asked for raw logits
+        (identity activation) and the sigmoid is applied here, because
+        sentence-transformers versions differ in whether predict() already
+        applies one, and RERANK_MIN_SCORE only means something on the 0..1 scale.
+        """
+        if not docs:
+            return []
+
+        model = self.model
+        scores = model.predict(
+            [(query, doc.page_content) for doc in docs],
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+            **identity_activation(model)
+        )
+        return [sigmoid(float(score)) for score in scores]
+
+    def rerank(self, query, docs, top_n=RERANK_TOP_N, min_score=RERANK_MIN_SCORE, min_keep=RERANK_MIN_KEEP):
+        """
+        Returns at most `top_n` docs, best first, dropping those below
+        `min_score` (but keeping at least `min_keep`). Each returned doc is a
+        copy carrying its score in metadata["rerank_score"].
+        """
+        ranked = sorted(zip(self.score(query, docs), docs), key=lambda pair: pair[0], reverse=True)
+
+        kept = []
+        for rank, (score, doc) in enumerate(ranked[:top_n]):
+            if min_score is not None and score < min_score and rank >= min_keep:
+                break
+            kept.append(Document(
+                page_content=doc.page_content,
+                metadata={**doc.metadata, "rerank_score": score}
+            ))
+        return kept
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    """
+    One reranker (and one loaded model) per process.
+    """
+    global _reranker
+
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = Reranker()
+
+    return _reranker
@@ -0,0 +1,132 @@
+import threading
+import time
+import traceback
+
+
+# ==========================================================
+# ---------------- RESOURCE REGISTRY -----------------------
+# ==========================================================
+#
+# Heavy per-process resources (embedding model, FAISS / BM25 stores, answer
+# cache, LLM client, cross-encoder) are built on first use instead of at
+# import, so importing the graph is cheap. warm_up() builds them ahead of
+# the first request, optionally on a background thread, and readiness()
+# reports "cold" / "warming" / "ready" / "failed" without blocking on it.
+
+_lock = threading.RLock()
+_resources = {}
+_state = {"status": "cold", "step": None, "error": None, "started_at": None, "warm_s": None}
+_warm_thread = None
+
+
+def get_resource(name, factory):
+    """
+    Returns the resource registered under `name`, building it with
+    `factory()` the first time. Concurrent first callers wait for one build.
+    """
+    resource = _resources.get(name)
+    if resource is not None:
+        return resource
+
+    with _lock:
+        if name not in _resources:
+            _resources[name] = factory()
+        return _resources[name]
+
+
+def get_retriever():
+    def build():
+        from hybrid_retrieval_agent import HybridRetrievalAgent
+        return HybridRetrievalAgent()
+
+    return get_resource("retriever", build)
+
+
+def get_answer_cache():
+    def build():
+        from answer_cache import AnswerCache
+        return AnswerCache(get_retriever().embeddings)
+
+    return get_resource("answer_cache", build)
+
+
+# ==========================================================
+# ---------------- WARM-UP / READINESS ---------------------
+# ==========================================================
+
+def _warm(llm, rerank):
+    from chain_registry import get_llm
+    from reranker_agent import get_reranker
+
+    steps = [("retriever", get_retriever), ("answer_cache", get_answer_cache)]
+    if llm:
+        steps.append(("llm", get_llm))
+    if rerank:
+        steps.append(("reranker", lambda: get_reranker().model))
+
+    start = time.perf_counter()
+    try:
+        for step, load in steps:
+            _state["step"] = step
+            load()
+    except Exception as e:
+        traceback.print_exc()
+        _state.update(status="failed", error=repr(e))
+        return
+
+    _state.update(status="ready", step=None, warm_s=time.perf_counter() - start)
+
+
+def warm_up(background=False, llm=True, rerank=False):
+    """
+    Builds the retriever and answer cache, then (optionally) the LLM client
+    and reranker model. With `background`, returns at once and loads on a
+    daemon thread. Repeated calls while warming or ready are no-ops.
+    """
+    global _warm_thread
+
+    with _lock:
+        if _state["status"] in ("warming", "ready"):
+            return
+        _state.update(status="warming", step="starting", error=None, started_at=time.time(), warm_s=None)
+
+        if background:
+            _warm_thread = threading.Thread(target=_warm, args=(llm, rerank), name="warm-up", daemon=True)
+            _warm_thread.start()
+            return
+
+    _warm(llm, rerank)
+
+
+def wait_until_ready(timeout=None):
+    """
+    Blocks until a warm-up started with warm_up(background=True) finishes.
+    Returns True when ready.
+    """
+    thread = _warm_thread
+    if thread is not None:
+        thread.join(timeout)
+    return _state["status"] == "ready"
+
+
+def readiness():
+    """
+    {"status": "cold" | "warming" | "ready" | "failed", ...}; never blocks.
+    """
+    state = dict(_state)
+    if state["status"] == "warming":
+        state["elapsed_s"] = time.time() - state["started_at"]
+    return state
+
+
+def is_ready():
+    return _state["status"] == "ready"
+
+
+def reset_resources():
+    """
+    Drops every built resource (e.g. after re-ingesting), back to "cold".
+    """
+    with _lock:
+        _resources.clear()
+        _state.update(status="cold", step=None, error=None, started_at=None, warm_s=None)
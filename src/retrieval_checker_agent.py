@@ -1,18 +1,21 @@
 from pydantic import BaseModel,Field
 import json
-from langchain_ollama import OllamaLLM
+from typing import List
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
-from query_analyzer_agent import load_llm
+from chain_registry import get_chain
+from verdict_cache import acached_verdicts, cached_verdict, cached_verdicts
+
+# Upper bound on grading calls in flight at once (set OLLAMA_NUM_PARALLEL on the
+# model server to at least this for the calls to actually overlap).
+MAX_CONCURRENCY = 8
 
 #=========================SCHEMA==============================================================
 class RelevanceDecision(BaseModel):
     is_relevant: bool=Field(...,description="True if the document helps answer the question ,else False")
 
-def relevance_checker(doc:str,user_query:str):
-    llm = load_llm()
-    is_relevant_prompt=PromptTemplate.from_template(
+is_relevant_prompt=PromptTemplate.from_template(
         """
         You are an expert document checker. Your job is to check each of the given documents based on their relevance
         and their ability to answer the given question.
@@ -26,9 +29,42 @@ def relevance_checker(doc:str,user_query:str):
         {user_query}
         
         """
-    )
+)
 
+def build_relevance_chain(llm):
     relevance_llm=llm.with_structured_output(RelevanceDecision)
-    chain= is_relevant_prompt | relevance_llm
-    result= chain.invoke({'doc':doc,'user_query':user_query})
+    return is_relevant_prompt | relevance_llm
+
+def relevance_checker(doc:str,user_query:str):
+    chain= get_chain("relevance", build_relevance_chain)
+    result= cached_verdict("relevance", is_relevant_prompt, RelevanceDecision, {'doc':doc,'user_query':user_query}, chain.invoke)
     return result.is_relevant
+
+def relevance_checker_batch(docs:List[str],user_query:str,max_concurrency:int=MAX_CONCURRENCY)->List[bool]:
+    """
+    Grades every candidate in one concurrent pass. Each doc still gets its own
+    prompt, so decisions are the same as calling relevance_checker per doc.
+    Docs with a cached verdict for this query are not sent to the LLM.
+    """
+    if not docs:
+        return []
+
+    chain= get_chain("relevance", build_relevance_chain)
+    results= cached_verdicts(
+        "relevance", is_relevant_prompt, RelevanceDecision,
+        [{'doc':doc,'user_query':user_query} for doc in docs],
+        lambda missing: chain.batch(missing, config={'max_concurrency':max_concurrency})
+    )
+    return [result.is_relevant for result in results]
+
+async def arelevance_checker_batch(docs:List[str],user_query:str,max_concurrency:int=MAX_CONCURRENCY)->List[bool]:
+    if not docs:
+        return []
+
+    chain= get_chain("relevance", build_relevance_chain)
+    results= await acached_verdicts(
+        "relevance", is_relevant_prompt, RelevanceDecision,
+        [{'doc':doc,'user_query':user_query} for doc in docs],
+        lambda missing: chain.abatch(missing, config={'max_concurrency':max_concurrency})
+    )
+    return [result.is_relevant for result in results]
@@ -1,8 +1,6 @@
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from query_analyzer_agent import load_llm
-
-llm = load_llm()
+from chain_registry import get_chain
 
 reviser_prompt = PromptTemplate.from_template("""
 You are a STRICT Grounded Answer Rewriter Agent inside a multi-agent RAG system.
@@ -73,12 +71,16 @@ Rewrite the answer so that it is FULLY SUPPORTED.
 """)
 
 
+def build_revise_answer_chain(llm):
+    return reviser_prompt | llm | StrOutputParser()
+
+
 def revise_answer(answer: str, context: str, query: str) -> str:
 
     if not context:
         return answer  # no context → cannot revise
 
-    chain = reviser_prompt | llm | StrOutputParser()
+    chain = get_chain("revise_answer", build_revise_answer_chain)
 
     result = chain.invoke({
         "query": query,
@@ -86,4 +88,54 @@ def revise_answer(answer: str, context: str, query: str) -> str:
         "answer": answer
     })
 
-    return result.strip()
\ No newline at end of file
+    return result.strip()
+
+
+async def arevise_answer(answer: str, context: str, query: str) -> str:
+
+    if not context:
+        return answer
+
+    chain = get_chain("revise_answer", build_revise_answer_chain)
+
+    result = await chain.ainvoke({
+        "query": query,
+        "context": context,
+        "answer": answer
+    })
+
+    return result.strip()
+
+
+def stream_revise_answer(answer: str, context: str, query: str):
+    """
+    Yields the revised answer as it is generated (unstripped; callers strip the joined text).
+    """
+
+    if not context:
+        yield answer
+        return
+
+    chain = get_chain("revise_answer", build_revise_answer_chain)
+
+    yield from chain.stream({
+        "query": query,
+        "context": context,
+        "answer": answer
+    })
+
+
+async def astream_revise_answer(answer: str, context: str, query: str):
+
+    if not context:
+        yield answer
+        return
+
+    chain = get_chain("revise_answer", build_revise_answer_chain)
+
+    async for chunk in chain.astream({
+        "query": query,
+        "context": context,
+        "answer": answer
+    }):
+        yield chunk
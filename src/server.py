@@ -0,0 +1,303 @@
+import argparse
+import asyncio
+import gc
+import json
+import os
+import signal
+import socket
+import traceback
+
+# Cheap: the retriever, embedding model and answer cache are built by
+# resources.warm_up (see serve / serve_prefork), not at import.
+from answer_cache import doc_sources
+from hybrid_retrieval_agent import normalize_filters
+from improved_rag_system import RERANK_ENABLED, ainvoke_with_cache
+from resources import readiness, warm_up
+
+
+# ==========================================================
+# ---------------------- CONFIG ----------------------------
+# ==========================================================
+
+HOST = "0.0.0.0"
+PORT = 8000
+
+MAX_CONCURRENT_QUERIES = 16   # graph runs in flight; the rest wait their turn
+REQUEST_TIMEOUT_S = 120.0     # includes time spent waiting for a slot
+MAX_BODY_BYTES = 64 * 1024
+
+WORKERS = 1                   # > 1: pre-fork that many worker processes (POSIX only)
+LISTEN_BACKLOG = 1024
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+# ==========================================================
+# ---------------- QUERY HANDLING --------------------------
+# ==========================================================
+
+class QueryService:
+    """
+    Runs concurrent questions through async_graph against the process-wide
+    retriever and chain registry, with a global concurrency limit and a
+    per-request timeout.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENT_QUERIES, timeout_s=REQUEST_TIMEOUT_S):
+        self.max_concurrency = max_concurrency
+        self.timeout_s = timeout_s
+        self.limiter = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+
+    async def _run(self, query, filters):
+        async with self.limiter:
+            self.in_flight += 1
+            try:
+                return await ainvoke_with_cache(query, filters=filters)
+            finally:
+                self.in_flight -= 1
+
+    async def answer(self, query, filters=None):
+        state = await asyncio.wait_for(self._run(query, filters), self.timeout_s)
+
+        return {
+            "answer": state.get("answer"),
+            "issup": state.get("issup"),
+            "isuse": state.get("isuse"),
+            "use_reason": state.get("use_reason"),
+            "evidence": state.get("evidence") or [],
+            # Cache hits carry the sources stored with the answer
+            "sources": state["sources"] if "sources" in state else doc_sources(state.get("relevant_docs")),
+            "cache_hit": state.get("cache_hit"),
+        }
+
+    async def route(self, method, path, body):
+        ready = readiness()
+
+        if path == "/health":
+            return 200, {
+                "status": "ok" if ready["status"] == "ready" else ready["status"],
+                "pid": os.getpid(),
+                "in_flight": self.in_flight,
+                "max_concurrency": self.max_concurrency,
+                "warm_up": ready,
+            }
+
+        if path == "/ready":
+            return (200 if ready["status"] == "ready" else 503), ready
+
+        if path != "/query":
+            return 404, {"error": f"unknown path {path}"}
+
+        if method != "POST":
+            return 405, {"error": "use POST /query"}
+
+        try:
+            request = json.loads(body or b"{}")
+            query = request.get("query", "").strip()
+            filters = request.get("filters")
+        except (ValueError, AttributeError):
+            return 400, {"error": "body must be JSON: {\"query\": \"...\"}"}
+
+        if not query:
+            return 400, {"error": "missing query"}
+
+        try:
+            normalize_filters(filters)
+        except (ValueError, TypeError, AttributeError):
+            return 400, {"error": "filters must be {\"topic\": ..., \"source_file\": \"glob\"}"}
+
+        if ready["status"] != "ready":
+            return 503, {"error": f"server is {ready['status']}", "warm_up": ready}
+
+        try:
+            return 200, await self.answer(query, filters)
+        except asyncio.TimeoutError:
+            return 504, {"error": f"query exceeded {self.timeout_s:g}s"}
+
+
+# ==========================================================
+# ---------------- MINIMAL HTTP/1.1 ------------------------
+# ==========================================================
+
+async def read_request(reader):
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    method, path, _ = request_line.split(" ", 2)
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY_BYTES:
+        raise OverflowError(length)
+
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path.split("?", 1)[0], body
+
+
+def write_response(writer, status, payload):
+    body = json.dumps(payload, default=str).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n".encode("latin-1") + body
+    )
+
+
+def make_handler(service):
+
+    async def handle(reader, writer):
+        try:
+            try:
+                method, path, body = await read_request(reader)
+            except OverflowError:
+                status, payload = 413, {"error": f"body larger than {MAX_BODY_BYTES} bytes"}
+            except (ValueError, asyncio.IncompleteReadError):
+                status, payload = 400, {"error": "malformed HTTP request"}
+            else:
+                try:
+                    status, payload = await service.route(method, path, body)
+                except Exception as e:
+                    status, payload = 500, {"error": repr(e)}
+
+            write_response(writer, status, payload)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def serve(host=HOST, port=PORT, max_concurrency=MAX_CONCURRENT_QUERIES, timeout_s=REQUEST_TIMEOUT_S, sock=None):
+    # Listen right away and load in the background: /health and /ready answer
+    # "warming" meanwhile, and /query returns 503 until the first warm-up ends.
+    # In a pre-forked worker everything but the LLM client is already loaded.
+    warm_up(background=True, rerank=RERANK_ENABLED)
+
+    service = QueryService(max_concurrency, timeout_s)
+
+    if sock is None:
+        server = await asyncio.start_server(make_handler(service), host, port)
+        print(f"🚀 Serving on http://{host}:{port} (POST /query, GET /health, GET /ready), "
+              f"max {max_concurrency} concurrent queries, {timeout_s:.0f}s timeout")
+    else:
+        server = await asyncio.start_server(make_handler(service), sock=sock)
+
+    async with server:
+        await server.serve_forever()
+
+
+# ==========================================================
+# ---------------- PRE-FORK WORKERS ------------------------
+# ==========================================================
+
+def run_worker(sock, max_concurrency, timeout_s):
+    """
+    Body of a forked worker: its own event loop (and lazily built LLM client)
+    accepting from the inherited listening socket. Never returns.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    status = 0
+    try:
+        asyncio.run(serve(max_concurrency=max_concurrency, timeout_s=timeout_s, sock=sock))
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        os._exit(status)
+
+
+def serve_prefork(host=HOST, port=PORT, workers=WORKERS, max_concurrency=MAX_CONCURRENT_QUERIES, timeout_s=REQUEST_TIMEOUT_S):
+    """
+    The parent loads everything heavy except the LLM client before forking,
+    so worker startup is a fork and the FAISS / BM25 / chunk pages stay
+    shared instead of being loaded once per worker. Workers accept on one
+    listening socket; dead workers are replaced.
+    """
+    if not hasattr(os, "fork"):
+        raise SystemExit("--workers > 1 needs os.fork (Linux/macOS); on Windows run one server per port.")
+
+    # HuggingFace tokenizers deadlock if their thread pool is used across a fork.
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+    print("Loading retriever and models before forking workers...")
+    warm_up(llm=False, rerank=RERANK_ENABLED)
+
+    sock = socket.create_server((host, port), backlog=LISTEN_BACKLOG)
+
+    # Move everything loaded so far out of the GC's reach: collections in the
+    # workers would otherwise write to (and un-share) every object's pages.
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def spawn(slot):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(sock, max_concurrency, timeout_s)
+        children[pid] = slot
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for slot in range(workers):
+        spawn(slot)
+
+    print(f"🚀 Serving on http://{host}:{port} (POST /query, GET /health, GET /ready) with {workers} pre-forked workers, "
+          f"max {max_concurrency} concurrent queries each, {timeout_s:.0f}s timeout")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+
+        slot = children.pop(pid, None)
+        if slot is not None and not stopping:
+            print(f"⚠️ Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting.")
+            spawn(slot)
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Asyncio HTTP server for the RAG graph")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENT_QUERIES)
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT_S)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Pre-forked worker processes sharing one index (POSIX)")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        serve_prefork(args.host, args.port, args.workers, args.max_concurrency, args.timeout)
+    else:
+        asyncio.run(serve(args.host, args.port, args.max_concurrency, args.timeout))
@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+import os
+import random
+import threading
+import time
+from typing import Any, List, Literal, Optional, Union, get_args, get_origin
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+
+# ==========================================================
+# ---------------------- CONFIG ----------------------------
+# ==========================================================
+#
+# Deterministic stand-in for the model server (VERITAS_LLM_BACKEND=stub):
+# replies depend only on the prompt, structured outputs are valid instances
+# of the requested schema, and latency/token counts are simulated, so the
+# whole graph can be load-tested without a GPU or Ollama.
+
+STUB_LATENCY_S = float(os.environ.get("VERITAS_STUB_LATENCY_S", 0.05))              # time to first token
+STUB_TOKEN_LATENCY_S = float(os.environ.get("VERITAS_STUB_TOKEN_LATENCY_S", 0.002))  # per output token
+STUB_COMPLETION_TOKENS = int(os.environ.get("VERITAS_STUB_COMPLETION_TOKENS", 120))  # free-text answers
+STUB_POSITIVE_RATE = float(os.environ.get("VERITAS_STUB_POSITIVE_RATE", 0.8))        # P(True / first Literal option)
+STUB_MAX_PARALLEL = int(os.environ.get("VERITAS_STUB_MAX_PARALLEL", 4))              # like OLLAMA_NUM_PARALLEL; 0 = unlimited
+CHARS_PER_TOKEN = 4
+
+_WORDS = (
+    "the column reflux ratio feed stage vapor liquid equilibrium heat transfer coefficient "
+    "pressure drop flow rate mass balance energy balance reactor conversion yield temperature"
+).split()
+
+
+# ==========================================================
+# ---------------- DETERMINISTIC OUTPUTS -------------------
+# ==========================================================
+
+def stub_value(annotation, rng, positive_rate):
+    """
+    A valid value for a pydantic field annotation. "Positive" answers
+    (True, the first Literal option: should_retrieve, fully_supported,
+    useful, ...) come up with probability `positive_rate`.
+    """
+    origin = get_origin(annotation)
+
+    if origin is Literal:
+        options = get_args(annotation)
+        if rng.random() < positive_rate or len(options) == 1:
+            return options[0]
+        return rng.choice(options[1:])
+
+    if origin is Union:
+        return stub_value(get_args(annotation)[0], rng, positive_rate)
+
+    if origin in (list, List):
+        return []
+
+    if annotation is bool:
+        return rng.random() < positive_rate
+
+    if annotation in (int, float):
+        return annotation(0)
+
+    return f"stub {rng.choice(_WORDS)} {rng.getrandbits(32):08x}"
+
+
+def stub_decision(schema, rng, positive_rate):
+    return schema(**{
+        name: stub_value(field.annotation, rng, positive_rate)
+        for name, field in schema.model_fields.items()
+    })
+
+
+def stub_answer(rng, num_tokens):
+    words = [rng.choice(_WORDS) for _ in range(max(num_tokens - 8, 1))]
+    return " ".join(words) + ". (Source: stub.pdf, Page: 1)"
+
+
+def count_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+# ==========================================================
+# ---------------- SIMULATED SERVER SLOTS ------------------
+# ==========================================================
+
+_thread_slots = {}
+_async_slots = {}
+_slots_lock = threading.Lock()
+
+
+def _thread_slot(max_parallel):
+    with _slots_lock:
+        return _thread_slots.setdefault(max_parallel, threading.BoundedSemaphore(max_parallel))
+
+
+def _async_slot(max_parallel):
+    key = (id(asyncio.get_running_loop()), max_parallel)
+    with _slots_lock:
+        return _async_slots.setdefault(key, asyncio.Semaphore(max_parallel))
+
+
+# ==========================================================
+# ---------------- STUB CHAT MODEL -------------------------
+# ==========================================================
+
+class StubChatModel(BaseChatModel):
+    """
+    Chat model whose replies are seeded by a hash of the prompt. Supports
+    invoke/batch/stream (sync and async) and with_structured_output, and
+    reports usage_metadata so the tracing callbacks count tokens as usual.
+    """
+
+    model: str = "veritas-stub"
+    latency_s: float = STUB_LATENCY_S
+    token_latency_s: float = STUB_TOKEN_LATENCY_S
+    completion_tokens: int = STUB_COMPLETION_TOKENS
+    positive_rate: float = STUB_POSITIVE_RATE
+    max_parallel: int = STUB_MAX_PARALLEL
+    structured_schema: Optional[Any] = None
+
+    @property
+    def _llm_type(self):
+        return "veritas-stub"
+
+    def with_structured_output(self, schema, **kwargs):
+        structured = self.model_copy(update={"structured_schema": schema})
+        return structured | RunnableLambda(lambda message: schema.model_validate_json(message.content))
+
+    # ---------------- replies ----------------
+
+    def _reply(self, messages):
+        prompt = "\n".join(str(message.content) for message in messages)
+        rng = random.Random(hashlib.sha1(prompt.encode("utf-8")).hexdigest())
+
+        if self.structured_schema is not None:
+            text = stub_decision(self.structured_schema, rng, self.positive_rate).model_dump_json()
+        else:
+            text = stub_answer(rng, self.completion_tokens)
+
+        usage = {
+            "input_tokens": count_tokens(prompt),
+            "output_tokens": count_tokens(text),
+            "total_tokens": count_tokens(prompt) + count_tokens(text),
+        }
+        return text, usage
+
+    def _duration(self, usage):
+        return self.latency_s + self.token_latency_s * usage["output_tokens"]
+
+    def _pieces(self, text):
+        words = text.split(" ")
+        return [word + " " for word in words[:-1]] + [words[-1]]
+
+    # ---------------- sync ----------------
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage = self._reply(messages)
+
+        if self.max_parallel:
+            with _thread_slot(self.max_parallel):
+                time.sleep(self._duration(usage))
+        else:
+            time.sleep(self._duration(usage))
+
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage = self._reply(messages)
+        pieces = self._pieces(text)
+
+        slot = _thread_slot(self.max_parallel) if self.max_parallel else None
+        if slot:
+            slot.acquire()
+        try:
+            time.sleep(self.latency_s)
+            for piece in pieces:
+                time.sleep(self.token_latency_s * usage["output_tokens"] / len(pieces))
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+                if run_manager:
+                    run_manager.on_llm_new_token(piece, chunk=chunk)
+                yield chunk
+        finally:
+            if slot:
+                slot.release()
+
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
+
+    # ---------------- async ----------------
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage = self._reply(messages)
+
+        if self.max_parallel:
+            async with _async_slot(self.max_parallel):
+                await asyncio.sleep(self._duration(usage))
+        else:
+            await asyncio.sleep(self._duration(usage))
+
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage = self._reply(messages)
+        pieces = self._pieces(text)
+
+        slot = _async_slot(self.max_parallel) if self.max_parallel else None
+        if slot:
+            await slot.acquire()
+        try:
+            await asyncio.sleep(self.latency_s)
+            for piece in pieces:
+                await asyncio.sleep(self.token_latency_s * usage["output_tokens"] / len(pieces))
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+                if run_manager:
+                    await run_manager.on_llm_new_token(piece, chunk=chunk)
+                yield chunk
+        finally:
+            if slot:
+                slot.release()
+
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
+
+
+def load_stub_llm():
+    return StubChatModel()
@@ -0,0 +1,125 @@
+import hashlib
+import json
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+
+# ==========================================================
+# ---------------- SYNTHETIC CORPUS ------------------------
+# ==========================================================
+#
+# Offline stand-in for the PDF library: topic folders, files and pages
+# with Zipf-distributed text, plus labelled queries drawn from each
+# page's rarest terms. Lets the benchmarks run without our PDFs.
+
+TOPICS = [
+    "distillation",
+    "heat_transfer",
+    "reaction_engineering",
+    "fluid_mechanics",
+    "thermodynamics",
+    "mass_transfer",
+]
+
+
+def generate_corpus(num_docs, files_per_topic=4, vocab_size=20000, doc_len=120, seed=0):
+    """
+    Returns `num_docs` one-chunk-per-page Documents with the same metadata
+    ingest.py attaches (topic, source_file, page_number, chunk_id).
+    Each topic draws a share of its words from its own slice of the vocabulary.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    topic_span = vocab_size // (2 * len(TOPICS))
+
+    chunks = []
+    for doc_id in range(num_docs):
+        topic_index = doc_id % len(TOPICS)
+        file_index = (doc_id // len(TOPICS)) % files_per_topic
+        page = doc_id // (len(TOPICS) * files_per_topic)
+
+        shared = np.minimum(rng.zipf(1.2, size=doc_len * 3 // 4), vocab_size // 2) - 1
+        topical = vocab_size // 2 + topic_index * topic_span + rng.integers(0, topic_span, size=doc_len // 4)
+        ids = rng.permutation(np.concatenate([shared, topical]))
+
+        chunks.append(Document(
+            page_content=" ".join(vocab[i] for i in ids),
+            metadata={
+                "topic": TOPICS[topic_index],
+                "source_file": f"{TOPICS[topic_index]}_{file_index}.pdf",
+                "page_number": int(page),
+                "chunk_id": f"synthetic-{doc_id}",
+            }
+        ))
+    return chunks
+
+
+def generate_queries(chunks, num_queries, terms_per_query=5, seed=0):
+    """
+    Labelled queries: a few of the longest (rarest, for Zipf text) terms of
+    a random page, expected to retrieve that page. Works on real chunks too.
+    """
+    rng = np.random.default_rng(seed)
+    queries = []
+
+    for doc_id in rng.choice(len(chunks), size=num_queries, replace=len(chunks) < num_queries):
+        chunk = chunks[int(doc_id)]
+        terms = sorted(set(chunk.page_content.split()), key=lambda t: (len(t), t), reverse=True)
+        pool = terms[:terms_per_query * 3]
+        picked = rng.choice(len(pool), size=min(terms_per_query, len(pool)), replace=False)
+
+        queries.append({
+            "query": " ".join(pool[i] for i in sorted(picked)),
+            "expected": [{
+                "source_file": chunk.metadata["source_file"],
+                "page_number": chunk.metadata["page_number"],
+            }],
+        })
+    return queries
+
+
+def write_queries(path, queries):
+    with open(path, "w", encoding="utf-8") as f:
+        for query in queries:
+            f.write(json.dumps(query) + "\n")
+
+
+def read_queries(path):
+    """
+    JSONL, one {"query": ..., "expected": [{"source_file": ..., "page_number": ...}]} per line.
+    """
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ==========================================================
+# ---------------- OFFLINE EMBEDDINGS ----------------------
+# ==========================================================
+
+HASHING_DIM = 384
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Feature-hashed bag of words, L2-normalized. Needs no model download,
+    so the dense path can be timed and sanity-checked fully offline.
+    """
+
+    def __init__(self, dim=HASHING_DIM):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in text.lower().split():
+            digest = int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16)
+            vector[digest % self.dim] += 1.0 if (digest >> 64) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
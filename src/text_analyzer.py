@@ -0,0 +1,253 @@
+import re
+
+
+# ==========================================================
+# ---------------------- CONFIG ----------------------------
+# ==========================================================
+#
+# The BM25 analysis chain. build_bm25_store records the config it indexed
+# with in the store's meta.json and BM25Index.load rebuilds the analyzer
+# from it, so queries are always analyzed exactly like the indexed text.
+
+ANALYZER_CONFIG = {
+    "stopwords": True,          # drop common English function words
+    "stemmer": "light",         # "light" (plural / possessive folding) or None
+    "formulas": True,           # keep chemical formulas whole: H2SO4, Ca(OH)2, NaCl
+    "units": True,              # "25 °C" / "25°C" -> "25°c" + "°c"; "1,000 kPa" -> "1000kpa" + "kpa"
+    "hyphenated": "both",       # "vapor-liquid" -> "split" (vapor, liquid), "join" (vaporliquid) or "both"
+    "min_token_len": 1,
+}
+
+TOKEN_CACHE_SIZE = 200_000      # analyzed raw tokens kept per analyzer (cleared when full)
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not of off on once only or other our ours ourselves out over own same she should so
+some such than that the their theirs them themselves then there these they this those through to too
+under until up very was we were what when where which while who whom why will with would you your
+yours yourself yourselves also may might must shall via per thus hence however therefore s t
+""".split())
+
+# Plural folds the suffix rules below would get wrong
+STEM_EXCEPTIONS = {
+    "gases": "gas",
+    "biases": "bias",
+    "analyses": "analysis",
+    "bases": "base",
+    "species": "species",
+    "series": "series",
+}
+
+UNITS = [
+    "°C", "°F", "°R", "degC", "degF", "K",
+    "MPa", "kPa", "Pa", "bar", "barg", "bara", "atm", "psi", "psia", "psig", "mmHg", "torr",
+    "kmol", "mol", "kg", "g", "mg", "lb", "lbm",
+    "m3", "m³", "m2", "m²", "cm3", "cm³", "mL", "L", "ft3", "gal",
+    "km", "m", "cm", "mm", "µm", "μm", "nm", "ft",
+    "MJ", "kJ", "J", "kcal", "cal", "Btu", "MW", "kW", "W", "hp", "kWh",
+    "h", "hr", "hrs", "min", "s", "sec", "ms",
+    "rpm", "Hz", "ppm", "ppb", "wt%", "mol%", "vol%", "%",
+]
+# "in", "t", "M" and "N" are left out: too often an ordinary word after a number
+
+UNIT_ALIASES = {
+    "degc": "°c",
+    "degf": "°f",
+    "hr": "h",
+    "hrs": "h",
+    "sec": "s",
+    "m³": "m3",
+    "m²": "m2",
+    "cm³": "cm3",
+    "μm": "µm",
+}
+
+# Unicode sub/superscript digits -> ASCII (H₂O -> H2O), and look-alike symbols
+_NORMALIZE = str.maketrans({
+    **{chr(0x2080 + i): str(i) for i in range(10)},
+    "º": "°",
+    "‐": "-",
+    "‑": "-",
+    "–": "-",
+})
+
+
+# ==========================================================
+# ---------------- PATTERNS --------------------------------
+# ==========================================================
+
+_NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+_UNIT = "|".join(re.escape(unit) for unit in sorted(UNITS, key=len, reverse=True))
+_ELEMENT = r"[A-Z][a-z]?\d*"
+
+TOKEN_PATTERN = re.compile(
+    # 25 °C, 1.5kPa, 3 m3/h, 40 wt%
+    rf"(?P<quantity>(?:{_NUMBER})\s?(?:{_UNIT})(?:/(?:{_UNIT}))?)(?![^\W_])"
+    # H2SO4, Ca(OH)2, NaCl (validated in _analyze_formula)
+    rf"|(?<![^\W_])(?P<formula>{_ELEMENT}(?:{_ELEMENT}|\((?:{_ELEMENT})+\)\d*)*)(?![^\W_(])"
+    rf"|(?P<number>{_NUMBER})(?![^\W_])"
+    # words, with hyphenated parts and an optional possessive
+    r"|(?P<word>[^\W_]+(?:-[^\W_]+)*(?:['’]s)?)"
+)
+
+_ELEMENT_PATTERN = re.compile(r"[A-Z][a-z]?")
+
+
+def normalize_number(text):
+    """
+    "1,000" -> "1000", "1.50" -> "1.5", "2.0" -> "2".
+    """
+    text = text.replace(",", "")
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return text
+
+
+def light_stem(token):
+    """
+    Plural / possessive folding (an S-stemmer with a few -es rules), so
+    "reactors" -> "reactor", "properties" -> "property", "processes" -> "process".
+    Short tokens and Latin/Greek -s endings (gas, basis, modulus) are kept.
+    """
+    if token in STEM_EXCEPTIONS:
+        return STEM_EXCEPTIONS[token]
+    if len(token) <= 3 or not token.endswith("s") or token[-2].isdigit():
+        return token
+
+    if token.endswith("ies") and not token.endswith(("eies", "aies")):
+        return token[:-3] + "y"
+    if token.endswith("sses"):
+        return token[:-2]
+    if token.endswith(("xes", "ches", "shes", "zes")):
+        return token[:-2]
+    if token.endswith("es") and not token.endswith(("aes", "ees", "oes")):
+        return token[:-1]
+    if token.endswith(("ss", "us", "is", "as")):
+        return token
+    return token[:-1]
+
+
+# ==========================================================
+# ---------------- ANALYZER --------------------------------
+# ==========================================================
+
+class Analyzer:
+    """
+    Text -> index terms. Callable; one compiled pattern pass over the text,
+    then per-token normalization memoized in a bounded dict.
+    """
+
+    def __init__(self, config=None):
+        self.config = {**ANALYZER_CONFIG, **(config or {})}
+
+        if self.config["stemmer"] not in ("light", None):
+            raise ValueError(f"Unknown stemmer: {self.config['stemmer']}")
+        if self.config["hyphenated"] not in ("split", "join", "both"):
+            raise ValueError(f"Unknown hyphenated mode: {self.config['hyphenated']}")
+
+        self._cache = {}
+
+    def __call__(self, text):
+        return self.analyze(text)
+
+    def analyze(self, text):
+        terms = []
+        cache = self._cache
+
+        for match in TOKEN_PATTERN.finditer(text.translate(_NORMALIZE)):
+            key = (match.lastgroup, match.group())
+            analyzed = cache.get(key)
+
+            if analyzed is None:
+                analyzed = self._analyze_token(*key)
+                if len(cache) >= TOKEN_CACHE_SIZE:
+                    cache.clear()
+                cache[key] = analyzed
+
+            terms.extend(analyzed)
+
+        return terms
+
+    # ---------------- per token ----------------
+
+    def _analyze_token(self, kind, raw):
+        if kind == "quantity":
+            return self._analyze_quantity(raw)
+        if kind == "formula":
+            return self._analyze_formula(raw)
+        if kind == "number":
+            return [normalize_number(raw)]
+        return self._analyze_word(raw)
+
+    def _analyze_quantity(self, raw):
+        number = re.match(_NUMBER, raw).group()
+        unit = raw[len(number):].strip()
+
+        if not self.config["units"]:
+            return [normalize_number(number)] + [
+                term for part in re.findall(r"[^\W_]+", unit) for term in self._analyze_word(part)
+            ]
+
+        unit = "/".join(UNIT_ALIASES.get(part.lower(), part.lower()) for part in unit.split("/"))
+        return [normalize_number(number) + unit, unit]
+
+    def _analyze_formula(self, raw):
+        """
+        A formula has a digit or parenthesis (H2O, Ca(OH)2) or mixed case with
+        two or more elements (NaCl, HCl); anything else (CSTR, CSTRs) is a word.
+        """
+        acronym_plural = raw.endswith("s") and raw[:-1].isupper()
+        mixed_case = any(c.islower() for c in raw) and len(_ELEMENT_PATTERN.findall(raw)) >= 2 and not acronym_plural
+        is_formula = any(c.isdigit() or c == "(" for c in raw) or mixed_case
+
+        if not (self.config["formulas"] and is_formula):
+            return [term for part in re.findall(r"[^\W_]+", raw) for term in self._analyze_word(part)]
+
+        return [raw.lower()]
+
+    def _analyze_word(self, raw):
+        token = raw.lower()
+        if token.endswith(("'s", "’s")):
+            token = token[:-2]
+
+        parts = token.split("-")
+        if len(parts) == 1:
+            term = self._term(token)
+            return [term] if term else []
+
+        mode = self.config["hyphenated"]
+        terms = []
+        if mode in ("split", "both"):
+            terms.extend(term for term in map(self._term, parts) if term)
+        if mode in ("join", "both"):
+            joined = self._term("".join(parts), stop=False)
+            if joined and not joined.isdigit():
+                terms.append(joined)
+        return terms
+
+    def _term(self, token, stop=True):
+        if stop and self.config["stopwords"] and token in STOPWORDS:
+            return None
+        if token.isdigit():
+            return token
+        if self.config["stemmer"] == "light":
+            token = light_stem(token)
+        return token if len(token) >= self.config["min_token_len"] else None
+
+
+_analyzers = {}
+
+
+def get_analyzer(config=None):
+    """
+    One shared analyzer (and token cache) per distinct config.
+    """
+    config = {**ANALYZER_CONFIG, **(config or {})}
+    key = tuple(sorted(config.items()))
+
+    analyzer = _analyzers.get(key)
+    if analyzer is None:
+        analyzer = _analyzers.setdefault(key, Analyzer(config))
+    return analyzer
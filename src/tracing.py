@@ -0,0 +1,218 @@
+import contextvars
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableConfig
+
+
+# ==========================================================
+# ---------------------- CONFIG ----------------------------
+# ==========================================================
+
+TRACE_LOG_PATH = os.path.join("logs", "traces.jsonl")  # None disables the JSONL sink
+AGGREGATE_WINDOW = 1000                                # spans kept per node for percentiles
+MAX_TRACES_IN_MEMORY = 200
+
+_current_span = contextvars.ContextVar("veritas_current_span", default=None)
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+# ==========================================================
+# ---------------- LLM CALL / TOKEN COUNTING ---------------
+# ==========================================================
+
+def token_usage(response):
+    """
+    (prompt_tokens, completion_tokens) from an LLMResult, for chat models
+    (usage_metadata) and plain Ollama completions (generation_info).
+    """
+    prompt = completion = 0
+
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt += usage.get("input_tokens", 0)
+                completion += usage.get("output_tokens", 0)
+                continue
+
+            info = generation.generation_info or {}
+            prompt += info.get("prompt_eval_count") or 0
+            completion += info.get("eval_count") or 0
+
+    return prompt, completion
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """
+    Attributes every LLM call to the graph node span active in the calling context.
+    Chat-model starts fall back to on_llm_start, so both are counted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        span = _current_span.get()
+        if span is not None:
+            with self._lock:
+                span["llm_calls"] += 1
+
+    def on_llm_end(self, response, **kwargs):
+        span = _current_span.get()
+        if span is not None:
+            prompt, completion = token_usage(response)
+            with self._lock:
+                span["prompt_tokens"] += prompt
+                span["completion_tokens"] += completion
+
+
+llm_call_counter = LLMCallCounter()
+
+
+# ==========================================================
+# ---------------- SPAN SINKS ------------------------------
+# ==========================================================
+
+class Tracer:
+    """
+    Receives one span per node execution; appends it to a JSONL file and
+    keeps per-node windows for percentile summaries plus recent traces.
+    """
+
+    def __init__(self, sink_path=TRACE_LOG_PATH, window=AGGREGATE_WINDOW, max_traces=MAX_TRACES_IN_MEMORY):
+        self.sink_path = sink_path
+        self.max_traces = max_traces
+        self._lock = threading.Lock()
+        self._by_node = defaultdict(lambda: deque(maxlen=window))
+        self._traces = OrderedDict()
+
+    def record(self, span):
+        with self._lock:
+            self._by_node[span["node"]].append(span)
+
+            if span["trace_id"] is not None:
+                self._traces.setdefault(span["trace_id"], []).append(span)
+                self._traces.move_to_end(span["trace_id"])
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+
+            if self.sink_path:
+                os.makedirs(os.path.dirname(self.sink_path) or ".", exist_ok=True)
+                with open(self.sink_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(span, default=str) + "\n")
+
+    def spans_for(self, trace_id):
+        with self._lock:
+            return list(self._traces.get(trace_id, []))
+
+    def summary(self):
+        """
+        {node: count, p50/p95/p99 ms, mean LLM calls and tokens per execution}
+        """
+        with self._lock:
+            by_node = {node: list(spans) for node, spans in self._by_node.items()}
+
+        summary = {}
+        for node, spans in by_node.items():
+            durations = np.asarray([span["duration_ms"] for span in spans])
+            summary[node] = {
+                "count": len(spans),
+                "p50_ms": float(np.percentile(durations, 50)),
+                "p95_ms": float(np.percentile(durations, 95)),
+                "p99_ms": float(np.percentile(durations, 99)),
+                "llm_calls": float(np.mean([span["llm_calls"] for span in spans])),
+                "prompt_tokens": float(np.mean([span["prompt_tokens"] for span in spans])),
+                "completion_tokens": float(np.mean([span["completion_tokens"] for span in spans])),
+            }
+        return summary
+
+
+tracer = Tracer()
+
+
+# ==========================================================
+# ---------------- NODE WRAPPER ----------------------------
+# ==========================================================
+
+def _count(value):
+    return len(value) if isinstance(value, list) else None
+
+
+def _start_span(name, state, config):
+    return {
+        "trace_id": ((config or {}).get("configurable") or {}).get("trace_id"),
+        "node": name,
+        "start": time.time(),
+        "duration_ms": None,
+        "llm_calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "rewrite_tries": state.get("rewrite_tries", 0),
+        "retries": state.get("retries", 0),
+        "docs_in": _count(state.get("docs")),
+        "docs_out": None,
+        "relevant_docs": None,
+        "error": None,
+    }
+
+
+def _finish_span(span, result):
+    if isinstance(result, dict):
+        span["docs_out"] = _count(result.get("docs"))
+        span["relevant_docs"] = _count(result.get("relevant_docs"))
+
+
+def traced(name, fn):
+    """
+    Wraps a graph node (sync or async) so each execution emits a span.
+    The trace ID comes from config["configurable"]["trace_id"] (see new_trace_id).
+    """
+
+    if inspect.iscoroutinefunction(fn):
+        async def wrapper(state, config: RunnableConfig = None):
+            span = _start_span(name, state, config)
+            token = _current_span.set(span)
+            start = time.perf_counter()
+
+            try:
+                result = await fn(state)
+                _finish_span(span, result)
+                return result
+            except Exception as e:
+                span["error"] = repr(e)
+                raise
+            finally:
+                span["duration_ms"] = (time.perf_counter() - start) * 1000
+                _current_span.reset(token)
+                tracer.record(span)
+    else:
+        def wrapper(state, config: RunnableConfig = None):
+            span = _start_span(name, state, config)
+            token = _current_span.set(span)
+            start = time.perf_counter()
+
+            try:
+                result = fn(state)
+                _finish_span(span, result)
+                return result
+            except Exception as e:
+                span["error"] = repr(e)
+                raise
+            finally:
+                span["duration_ms"] = (time.perf_counter() - start) * 1000
+                _current_span.reset(token)
+                tracer.record(span)
+
+    wrapper.__name__ = name
+    return wrapper
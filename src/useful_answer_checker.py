@@ -2,9 +2,8 @@ from pydantic import BaseModel, Field
 from langchain_core.prompts import PromptTemplate
 from typing import Literal
 
-from query_analyzer_agent import load_llm
-
-llm = load_llm()
+from chain_registry import get_chain
+from verdict_cache import acached_verdict, cached_verdict
 
 
 # ========================= SCHEMA =========================
@@ -41,6 +40,10 @@ ANSWER:
 """)
 
 
+def build_isuse_chain(llm):
+    return isuse_prompt | llm.with_structured_output(IsUSEDecision)
+
+
 def is_useful(question: str, answer: str) -> IsUSEDecision:
 
     if not answer:
@@ -49,13 +52,27 @@ def is_useful(question: str, answer: str) -> IsUSEDecision:
             reason="No answer provided."
         )
 
-    use_checker_llm = llm.with_structured_output(IsUSEDecision)
-
-    chain = isuse_prompt | use_checker_llm
+    chain = get_chain("isuse", build_isuse_chain)
 
-    decision = chain.invoke({
+    decision = cached_verdict("isuse", isuse_prompt, IsUSEDecision, {
         "question": question,
         "answer": answer
-    })
+    }, chain.invoke)
+
+    return decision
+
+
+async def ais_useful(question: str, answer: str) -> IsUSEDecision:
+
+    if not answer:
+        return IsUSEDecision(
+            isuse="not-useful",
+            reason="No answer provided."
+        )
+
+    chain = get_chain("isuse", build_isuse_chain)
 
-    return decision
\ No newline at end of file
+    return await acached_verdict("isuse", isuse_prompt, IsUSEDecision, {
+        "question": question,
+        "answer": answer
+    }, chain.ainvoke)
@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from chain_registry import model_id
+
+
+# ==========================================================
+# ---------------------- CONFIG ----------------------------
+# ==========================================================
+#
+# The graders (IsSUP, IsUSE, relevance) are pure functions of their inputs,
+# so a verdict for byte-identical inputs is reused instead of asking the LLM
+# again - across rewrite loops, repeated questions and process restarts.
+# Keys cover the agent, its prompt text, the output schema and the model,
+# so editing a prompt or switching models never serves stale verdicts.
+
+VERDICT_CACHE_PATH = os.path.join("cache", "verdicts.sqlite3")   # None disables the cache
+MAX_ENTRIES = 100_000
+EVICT_CHECK_EVERY = 256        # inserts between size checks
+EVICT_TO_FRACTION = 0.9        # evict least recently used rows down to this share of MAX_ENTRIES
+
+
+def prompt_version(prompt):
+    return hashlib.sha1(prompt.template.encode("utf-8")).hexdigest()[:12]
+
+
+class VerdictCache:
+    """
+    SQLite (WAL mode) store of pydantic decisions. One connection per
+    process, opened lazily, so pre-forked workers each get their own.
+    """
+
+    def __init__(self, path=VERDICT_CACHE_PATH, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._inserts = 0
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0}
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts ("
+                " key TEXT PRIMARY KEY,"
+                " agent TEXT NOT NULL,"
+                " decision TEXT NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)")
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    @staticmethod
+    def make_key(agent, prompt, schema, model, inputs):
+        payload = json.dumps(
+            {
+                "agent": agent,
+                "prompt": prompt_version(prompt),
+                "schema": schema.__name__,
+                "model": model,
+                "inputs": inputs,
+            },
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys, schema):
+        """
+        {key: decision} for the keys present; refreshes their LRU timestamps.
+        """
+        if not keys:
+            return {}
+
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute(
+                f"SELECT key, decision FROM verdicts WHERE key IN ({','.join('?' * len(keys))})",
+                list(keys)
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE verdicts SET last_used = ? WHERE key = ?",
+                    [(time.time(), key) for key, _ in rows]
+                )
+                conn.commit()
+
+            self.stats["hits"] += len(rows)
+            self.stats["misses"] += len(set(keys)) - len(rows)
+
+        return {key: schema.model_validate_json(decision) for key, decision in rows}
+
+    def put_many(self, agent, items):
+        """
+        items: [(key, decision)]. Decisions that failed to parse (None) are skipped.
+        """
+        rows = [(key, agent, decision.model_dump_json(), time.time()) for key, decision in items if decision is not None]
+        if not rows:
+            return
+
+        with self._lock:
+            conn = self._connection()
+            conn.executemany("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?)", rows)
+            conn.commit()
+
+            self._inserts += len(rows)
+            if self._inserts >= EVICT_CHECK_EVERY:
+                self._inserts = 0
+                self._evict(conn)
+
+    def _evict(self, conn):
+        (count,) = conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()
+        excess = count - int(self.max_entries * EVICT_TO_FRACTION)
+
+        if count > self.max_entries and excess > 0:
+            conn.execute(
+                "DELETE FROM verdicts WHERE key IN (SELECT key FROM verdicts ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            conn.commit()
+            self.stats["evicted"] += excess
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM verdicts")
+            conn.commit()
+
+
+verdict_cache = VerdictCache()
+
+
+# ==========================================================
+# ---------------- CACHED GRADER CALLS ---------------------
+# ==========================================================
+
+def cached_verdicts(agent, prompt, schema, inputs, compute):
+    """
+    One decision per inputs dict, in order. Only the inputs without a cached
+    verdict are passed (as a list) to `compute`, which returns their decisions.
+    """
+    if verdict_cache.path is None:
+        return compute(inputs)
+
+    model = model_id()
+    keys = [verdict_cache.make_key(agent, prompt, schema, model, item) for item in inputs]
+    found = verdict_cache.get_many(keys, schema)
+
+    missing = [i for i, key in enumerate(keys) if key not in found]
+    if missing:
+        computed = compute([inputs[i] for i in missing])
+        verdict_cache.put_many(agent, [(keys[i], decision) for i, decision in zip(missing, computed)])
+        found.update((keys[i], decision) for i, decision in zip(missing, computed))
+
+    return [found[key] for key in keys]
+
+
+async def acached_verdicts(agent, prompt, schema, inputs, acompute):
+    """
+    cached_verdicts with an async `acompute`. The SQLite lookup and store
+    (and model_id, which may build the LLM client) run in a worker thread:
+    with several workers writing the same WAL database a write can wait on
+    the busy lock for up to the 30 s timeout, which must not stall the loop.
+    """
+    if verdict_cache.path is None:
+        return await acompute(inputs)
+
+    model = await asyncio.to_thread(model_id)
+    keys = [verdict_cache.make_key(agent, prompt, schema, model, item) for item in inputs]
+    found = await asyncio.to_thread(verdict_cache.get_many, keys, schema)
+
+    missing = [i for i, key in enumerate(keys) if key not in found]
+    if missing:
+        computed = await acompute([inputs[i] for i in missing])
+        await asyncio.to_thread(
+            verdict_cache.put_many, agent, [(keys[i], decision) for i, decision in zip(missing, computed)]
+        )
+        found.update((keys[i], decision) for i, decision in zip(missing, computed))
+
+    return [found[key] for key in keys]
+
+
+def cached_verdict(agent, prompt, schema, inputs, compute):
+    """
+    Single-call form: `compute(inputs)` returns one decision.
+    """
+    return cached_verdicts(agent, prompt, schema, [inputs], lambda missing: [compute(missing[0])])[0]
+
+
+async def acached_verdict(agent, prompt, schema, inputs, acompute):
+    async def acompute_missing(missing):
+        return [await acompute(missing[0])]
+
+    return (await acached_verdicts(agent, prompt, schema, [inputs], acompute_missing))[0]
@@ -0,0 +1,89 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+faiss = pytest.importorskip("faiss")
+np = pytest.importorskip("numpy")
+pytest.importorskip("langchain_community")
+
+from dense_index import (
+    ANN_INDEX_FILE, ANN_META_FILE, FLAT_INDEX_FILE, INDEX_TYPES,
+    build_ann_index, factory_string, read_ann_meta, read_index, set_search_params, write_ann_index
+)
+
+NUM_VECTORS = 2000
+DIM = 384
+
+
+@pytest.fixture(scope="module")
+def flat_index():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((NUM_VECTORS, DIM)).astype(np.float32)
+    index = faiss.IndexFlatL2(DIM)
+    index.add(vectors)
+    return index
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_build_load_and_search_every_index_type(flat_index, index_type, tmp_path):
+    # Written and read back the way ingest.py and load_dense_store do (memory-mapped, read-only)
+    if index_type == "flat":
+        path = os.path.join(tmp_path, FLAT_INDEX_FILE)
+        faiss.write_index(flat_index, path)
+        meta = None
+    else:
+        index, meta = build_ann_index(flat_index, index_type)
+        write_ann_index(index, meta, str(tmp_path))
+        path = os.path.join(tmp_path, ANN_INDEX_FILE)
+        assert read_ann_meta(str(tmp_path))["index_type"] == index_type
+
+    loaded = read_index(path)
+    assert loaded.ntotal == NUM_VECTORS
+
+    set_search_params(loaded, meta, nprobe=8, ef_search=64)
+    queries = flat_index.reconstruct_n(0, 10)
+    distances, rows = loaded.search(queries, 5)
+
+    assert rows.shape == (10, 5)
+    assert (rows >= 0).all()
+    if index_type != "ivf_pq":
+        # Each query vector is in the index; everything but PQ finds it exactly
+        assert (rows[:, 0] == np.arange(10)).mean() >= 0.9
+
+
+def test_ivf_nlist_is_capped_for_small_corpora():
+    vectors = np.random.default_rng(1).standard_normal((10, DIM)).astype(np.float32)
+    small = faiss.IndexFlatL2(DIM)
+    small.add(vectors)
+
+    assert factory_string("ivf_flat", DIM, 10, nlist=64)[0] == "IVF10,Flat"
+    index, meta = build_ann_index(small, "ivf_flat", nlist=64)
+    assert index.ntotal == 10 and meta["params"]["nlist"] == 10
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "ivf_pq"])
+def test_update_dense_index_removes_stale_ann_index_when_untrainable(flat_index, index_type, tmp_path, monkeypatch):
+    ingest = pytest.importorskip("ingest")
+    monkeypatch.setattr(ingest, "VECTOR_DB_DIR", str(tmp_path))
+
+    index, meta = build_ann_index(flat_index, "ivf_flat")
+    write_ann_index(index, meta, str(tmp_path))
+
+    # Every PDF deleted (empty store), or too few vectors to train PQ
+    remaining = 0 if index_type == "ivf_flat" else 100
+    store = faiss.IndexFlatL2(DIM)
+    if remaining:
+        store.add(flat_index.reconstruct_n(0, remaining))
+
+    class Vectorstore:
+        pass
+
+    vectorstore = Vectorstore()
+    vectorstore.index = store
+    ingest.update_dense_index(vectorstore, index_type, None, 48, 32)
+
+    assert not os.path.exists(os.path.join(tmp_path, ANN_INDEX_FILE))
+    assert not os.path.exists(os.path.join(tmp_path, ANN_META_FILE))
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+pytest.importorskip("langgraph")
+from langchain_core.documents import Document
+
+from improved_rag_system import MAX_RELEVANT_DOCS, accumulate_relevant
+
+
+def make_doc(chunk_id):
+    return Document(page_content=f"chunk {chunk_id}", metadata={"chunk_id": chunk_id})
+
+
+def test_rewrite_loop_new_relevant_docs_survive_the_cap():
+    # Loop 1 filled the cap; its answer failed IsSUP / IsUSE.
+    loop1_docs = [make_doc(f"old-{i}") for i in range(MAX_RELEVANT_DOCS)]
+    loop1 = accumulate_relevant({"docs": loop1_docs}, loop1_docs, [True] * len(loop1_docs))
+    assert [doc.metadata["chunk_id"] for doc in loop1["relevant_docs"]] == [f"old-{i}" for i in range(MAX_RELEVANT_DOCS)]
+
+    # Loop 2: the rewritten query finds two new relevant chunks and one irrelevant one.
+    new_docs = [make_doc("new-0"), make_doc("new-1"), make_doc("new-2")]
+    loop2_state = {**loop1, "docs": new_docs + loop1_docs[:1]}
+    loop2 = accumulate_relevant(loop2_state, new_docs, [True, False, True])
+
+    ids = [doc.metadata["chunk_id"] for doc in loop2["relevant_docs"]]
+    assert len(ids) == MAX_RELEVANT_DOCS
+    assert ids[:3] == ["new-0", "new-2", "old-0"]
+    assert "new-1" not in ids
+    assert loop2["relevance_memo"]["new-1"] is False
+
+
+def test_carried_docs_fill_remaining_slots_without_duplicates():
+    carried = [make_doc("a"), make_doc("b")]
+    state = {"docs": [make_doc("b"), make_doc("c")], "relevant_docs": carried, "relevance_memo": {"a": True, "b": True}}
+
+    result = accumulate_relevant(state, [make_doc("c")], [True])
+
+    assert [doc.metadata["chunk_id"] for doc in result["relevant_docs"]] == ["b", "c", "a"]
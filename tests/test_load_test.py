@@ -0,0 +1,31 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("langgraph")
+pytest.importorskip("faiss")
+
+LOAD_TEST = os.path.join(os.path.dirname(__file__), os.pardir, "src", "load_test.py")
+
+
+@pytest.mark.parametrize("driver", [[], ["--async"]], ids=["graph.invoke", "async_graph.ainvoke"])
+def test_stub_queries_run_end_to_end(driver, tmp_path):
+    # Its own process: the LLM backend, store dir and embeddings are read from the environment at import
+    report_path = os.path.join(tmp_path, "report.json")
+    completed = subprocess.run(
+        [sys.executable, LOAD_TEST, "--num-queries", "8", "--num-docs", "300", "--concurrency", "4",
+         "--llm-latency", "0", "--token-latency", "0", "--json", report_path, *driver],
+        capture_output=True, text=True, timeout=600
+    )
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+
+    with open(report_path, encoding="utf-8") as f:
+        report = json.load(f)
+
+    assert report["queries"] == 8
+    assert report["errors"] == 0
+    assert report["llm_calls_per_query"]["mean"] >= 1
+    assert "decide_retrieval" in report["per_node"]